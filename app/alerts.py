@@ -0,0 +1,292 @@
+import hashlib
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from .bot_handlers import (
+    ALERT_CHAT_ID,
+    fmt_date,
+    fmt_money,
+    get_notice_url,
+    get_view_batch,
+    get_view_version,
+)
+from .database import SessionLocal
+from .models import AlertDelivery, AlertSeen, Subscription
+from .outbound import fan_out
+from .subscriptions import load_index
+from .updater import get_meta, set_meta, upsert_rows
+
+log = logging.getLogger(__name__)
+
+# vistas vigiladas: anuncios abiertos
+ALERT_VIEWS = (("OBR", "ABI"), ("SERV", "ABI"))
+
+MAX_MESSAGE_LEN = 4096
+SEEN_CHUNK = 500
+
+# un aviso que falla en un destino se reintenta en las siguientes
+# pasadas; después se da por perdido y deja de bloquear su cola
+MAX_DELIVERY_ATTEMPTS = 3
+
+
+# =========================
+# DIFF
+# =========================
+def fingerprint(it):
+    raw = "|".join(
+        str(x)
+        for x in (
+            it.object,
+            it.deadline_date,
+            it.budget,
+            it.entity,
+        )
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+async def load_seen(db, keys):
+    seen = {}
+    for i in range(0, len(keys), SEEN_CHUNK):
+        chunk = keys[i:i + SEEN_CHUNK]
+        rows = await db.execute(
+            select(AlertSeen.notice_key, AlertSeen.fingerprint)
+            .where(AlertSeen.notice_key.in_(chunk))
+        )
+        seen.update(rows.all())
+    return seen
+
+
+async def diff_view(db, contrato, estado):
+    """
+    Devuelve (source, batch, [(key, fingerprint, fila, is_new)]) con los
+    anuncios nuevos o cambiados desde la última pasada; `fila` indexa
+    batch.items y sus columnas.
+    """
+    version = await get_view_version(contrato, estado, db)
+    source = version[0]
+    batch = await get_view_batch(contrato, estado, db, version)
+
+    current = {}
+    for i, it in enumerate(batch.items):
+        key = f"{source}:{it.id}"
+        current[key] = (fingerprint(it), i)
+
+    seen = await load_seen(db, list(current))
+
+    changes = [
+        (key, fp, i, key not in seen)
+        for key, (fp, i) in current.items()
+        if seen.get(key) != fp
+    ]
+    return source, batch, changes
+
+
+# =========================
+# MENSAJES
+# =========================
+def format_alert(contrato, batch, i, is_new):
+    it = batch.items[i]
+    deadline = it.deadline_date
+    amount = it.budget
+
+    urgent = " ❗" if batch.urgent[i] else ""
+    icon = "💎" if batch.big[i] else "💵"
+    url = get_notice_url(it) or "—"
+
+    return (
+        f"{'🆕' if is_new else '✏️'} {contrato} · {it.entity}\n"
+        f"• {it.object}\n"
+        f"⏰ {fmt_date(deadline)}{urgent} · {icon} {fmt_money(amount)}\n"
+        f"🔗 {url}"
+    )
+
+
+def pack_messages(blocks, limit=MAX_MESSAGE_LEN):
+    """
+    Agrupa bloques (texto, key) en el menor número de mensajes que
+    caben en el límite de Telegram.
+    """
+    messages = []
+    text, keys = "", []
+    for block, key in blocks:
+        block = block[:limit]
+        candidate = f"{text}\n\n{block}" if text else block
+        if len(candidate) > limit:
+            messages.append((text, keys))
+            text, keys = block, [key]
+        else:
+            text = candidate
+            keys.append(key)
+    if text:
+        messages.append((text, keys))
+    return messages
+
+
+# =========================
+# PIPELINE
+# =========================
+async def queue_deliveries(db, index, contrato, batch, changes):
+    """
+    Encola en alert_deliveries cada cambio para el grupo de alertas (si
+    está configurado) y para cada chat suscrito que case con él.
+    """
+    targets = {}
+    if ALERT_CHAT_ID:
+        targets[ALERT_CHAT_ID] = [key for key, _, _, _ in changes]
+    if index:
+        matched = index.fan_out(
+            contrato,
+            [(key, batch.items[i]) for key, _, i, _ in changes],
+        )
+        for chat_id, keys in matched.items():
+            targets.setdefault(chat_id, []).extend(keys)
+
+    now = datetime.utcnow()
+    by_key = {key: (fp, is_new) for key, fp, _, is_new in changes}
+    rows = [
+        {
+            "chat_id": chat_id,
+            "notice_key": key,
+            "fingerprint": by_key[key][0],
+            "contract_type": contrato,
+            "is_new": by_key[key][1],
+            "attempts": 0,
+            "created_at": now,
+            "sent_at": None,
+        }
+        for chat_id, keys in targets.items()
+        for key in dict.fromkeys(keys)
+    ]
+    await upsert_rows(db, AlertDelivery, rows)
+    return len(rows)
+
+
+async def deliver_pending(bot, db, contrato, source, batch):
+    """
+    Envía lo pendiente de la vista a cada destino, empaquetado por chat
+    y con su propio rate limit. Cada mensaje marca sus avisos como
+    enviados o suma un intento: un destino o un mensaje que falla no
+    bloquea a los demás. Devuelve (enviados, fallidos, chats bloqueados).
+    """
+    pending = (await db.execute(
+        select(AlertDelivery)
+        .where(
+            AlertDelivery.contract_type == contrato,
+            AlertDelivery.sent_at.is_(None),
+            AlertDelivery.attempts < MAX_DELIVERY_ATTEMPTS,
+        )
+        .order_by(AlertDelivery.chat_id, AlertDelivery.created_at)
+    )).scalars().all()
+    if not pending:
+        return 0, 0, set()
+
+    position = {f"{source}:{it.id}": i for i, it in enumerate(batch.items)}
+
+    by_chat = {}
+    for row in pending:
+        i = position.get(row.notice_key)
+        if i is None:
+            # el anuncio ya no está en la vista (cerrado, otra fuente)
+            await db.delete(row)
+            continue
+        block = format_alert(contrato, batch, i, row.is_new)
+        by_chat.setdefault(row.chat_id, []).append((block, row))
+
+    messages, message_rows = [], []
+    for chat_id, blocks in by_chat.items():
+        for text, rows in pack_messages(blocks):
+            messages.append((chat_id, text))
+            message_rows.append(rows)
+
+    results, blocked = await fan_out(bot, messages, disable_web_page_preview=True)
+
+    now = datetime.utcnow()
+    sent = failed = 0
+    for (chat_id, _), ok, rows in zip(messages, results, message_rows):
+        if ok is None or chat_id in blocked:
+            continue
+        for row in rows:
+            if ok:
+                row.sent_at = now
+                sent += 1
+            else:
+                row.attempts += 1
+                failed += 1
+                if row.attempts >= MAX_DELIVERY_ATTEMPTS:
+                    log.warning(
+                        "⚠️ Aviso %s a %s descartado tras %s intentos",
+                        row.notice_key, row.chat_id, row.attempts,
+                    )
+
+    if blocked:
+        await drop_chats(db, blocked)
+
+    await db.commit()
+    return sent, failed, blocked
+
+
+async def drop_chats(db, chat_ids):
+    """
+    Chats donde el bot está bloqueado o expulsado: se borran sus
+    suscripciones y sus envíos pendientes para no insistir cada pasada.
+    """
+    chat_ids = list(chat_ids)
+    subs = (await db.execute(
+        delete(Subscription)
+        .where(Subscription.chat_id.in_(chat_ids))
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    pending = (await db.execute(
+        delete(AlertDelivery)
+        .where(
+            AlertDelivery.chat_id.in_(chat_ids),
+            AlertDelivery.sent_at.is_(None),
+        )
+        .execution_options(synchronize_session=False)
+    )).rowcount
+    log.warning(
+        "🚫 Chats %s sin acceso: %s suscripciones y %s envíos pendientes borrados",
+        chat_ids, subs, pending,
+    )
+
+
+async def run_alerts(bot):
+    today = datetime.utcnow().date()
+
+    async with SessionLocal() as db:
+        index = await load_index(db)
+
+        for contrato, estado in ALERT_VIEWS:
+            source, batch, changes = await diff_view(db, contrato, estado)
+
+            if changes:
+                rows = [
+                    {"notice_key": key, "fingerprint": fp, "seen_at": datetime.utcnow()}
+                    for key, fp, _, _ in changes
+                ]
+
+                # primera pasada de una fuente: se siembra sin avisar
+                seeded_key = f"alerts_seeded_{source}_{contrato}"
+                if await get_meta(db, seeded_key, None) is None:
+                    await upsert_rows(db, AlertSeen, rows)
+                    await set_meta(db, seeded_key, today.isoformat())
+                    await db.commit()
+                    log.info("🔔 Alertas %s/%s sembradas (%s anuncios)", source, contrato, len(rows))
+                    continue
+
+                # los cambios quedan vistos en cuanto se encolan: la
+                # entrega a cada destino se sigue en alert_deliveries
+                queued = await queue_deliveries(db, index, contrato, batch, changes)
+                await upsert_rows(db, AlertSeen, rows)
+                await db.commit()
+                log.info("🔔 %s cambios %s, %s envíos encolados", len(changes), contrato, queued)
+
+            sent, failed, blocked = await deliver_pending(bot, db, contrato, source, batch)
+            if sent or failed:
+                log.info("🔔 %s avisos %s enviados, %s fallidos", sent, contrato, failed)
+            if blocked:
+                # sus suscripciones ya no existen: fuera también del índice
+                index = await load_index(db)
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+
+import numpy as np
+
+BIG_AMOUNT = 1_000_000
+ALERT_DAYS = 7
+
+# sin deadline: al final, igual que `or date.max` al ordenar
+NO_DEADLINE = date.max.toordinal()
+
+
+# =========================
+# LOTE COLUMNAR DE ANUNCIOS
+# =========================
+class ItemBatch:
+    """
+    Los items de una vista en columnas (código de entidad, deadline como
+    día ordinal, importe) para sacar en una pasada agrupada lo que
+    resumen, detalle y alertas calculaban item a item:
+
+    - order / bounds: items agrupados por entidad (orden alfabético) y,
+      dentro de cada una, por deadline (estable)
+    - count: nº de anuncios por entidad
+    - days_left / urgent / big: días hasta el deadline y avisos ❗ / 💎
+    """
+
+    def __init__(self, items, today=None):
+        today = today or datetime.utcnow().date()
+        self.items = items
+
+        names = [it.entity for it in items]
+        self.entity_names = sorted(set(names))
+        codes = {name: i for i, name in enumerate(self.entity_names)}
+        n = len(items)
+
+        self.entity = np.fromiter((codes[x] for x in names), np.int32, n)
+        self.deadline = np.fromiter(
+            (
+                d.toordinal() if (d := it.deadline_date) else NO_DEADLINE
+                for it in items
+            ),
+            np.int32,
+            n,
+        )
+        self.budget = np.fromiter(
+            (
+                x if (x := it.budget) is not None else np.nan
+                for it in items
+            ),
+            np.float64,
+            n,
+        )
+
+        has_deadline = self.deadline != NO_DEADLINE
+        self.days_left = np.where(has_deadline, self.deadline - today.toordinal(), 0)
+        self.urgent = has_deadline & (self.days_left <= ALERT_DAYS)
+        self.big = np.nan_to_num(self.budget) >= BIG_AMOUNT
+
+        # lexsort es estable: a igual deadline se conserva el orden de llegada
+        self.order = np.lexsort((self.deadline, self.entity))
+        self.count = np.bincount(self.entity, minlength=len(self.entity_names))
+        self.bounds = np.concatenate(([0], np.cumsum(self.count)))
+
+    def __len__(self):
+        return len(self.entity_names)
+
+    def rows(self, e):
+        """Índices (en self.items) de la entidad e, ya ordenados."""
+        return self.order[self.bounds[e]:self.bounds[e + 1]]
+
+    def entity_items(self, e):
+        return [self.items[i] for i in self.rows(e)]
+
+    def running_totals(self, e):
+        """Total acumulado tras cada anuncio de la entidad e."""
+        return np.cumsum(np.nan_to_num(self.budget[self.rows(e)]))
@@ -1,22 +1,30 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiogram.exceptions import TelegramBadRequest
 from datetime import datetime, timedelta
 import time
 import re
-import unicodedata
-import feedparser
+from collections import OrderedDict
 from fastapi import FastAPI
 import uvicorn
 import asyncio
-
+import logging
 
 import httpx
-from bs4 import BeautifulSoup
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import outbound, queries, search, subscriptions, view_state
+from .batch import ALERT_DAYS, BIG_AMOUNT, ItemBatch
+from .classifier import classify_batch
+from .config import settings
+from .enrichment import enrich_items
+from .records import NoticeItem
+from .rss_client import fetch_entries
 
 ENRICH_FROM_HTML = False
 
+log = logging.getLogger(__name__)
+
 
 # =========================
 # HEALTH CHECK (UPTIMEROBOT)
@@ -28,18 +36,6 @@ app = FastAPI()
 async def health():
     return {"status": "ok"}
 
-def normalize_text(s: str) -> str:
-    if not s:
-        return ""
-    s = unicodedata.normalize("NFD", s)
-    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
-    s = s.upper()
-    s = re.sub(r"[^A-Z0-9 ]+", " ", s)
-    return s
-
-def setup_scheduler(bot):
-    pass
-
 router = Router()
 
 
@@ -57,76 +53,6 @@ RE_BUDGET = re.compile(
     re.IGNORECASE
 )
 
-# =========================
-# SCRAPING HTML ANUNCIO
-# =========================
-
-SEM = asyncio.Semaphore(2)  # máximo 2 peticiones simultáneas
-
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (compatible; OCGIPBOT/1.0)"
-}
-
-async def scrape_notice(url: str):
-    async with SEM:
-        try:
-            async with httpx.AsyncClient(
-                headers=HEADERS,
-                timeout=20,
-                follow_redirects=True
-            ) as client:
-                r = await client.get(url)
-                r.raise_for_status()
-        except Exception:
-            return {}
-
-    soup = BeautifulSoup(r.text, "html.parser")
-    text = soup.get_text(" ", strip=True)
-
-    out = {}
-
-    # 📅 FECHA LÍMITE
-    m = re.search(
-        r"Fecha límite.*?(\d{2}/\d{2}/\d{4})",
-        text,
-        re.IGNORECASE
-    )
-    if m:
-        try:
-            out["deadlineDate"] = datetime.strptime(
-                m.group(1), "%d/%m/%Y"
-            ).date().isoformat()
-        except Exception:
-            pass
-
-    # 💰 PRESUPUESTO
-    m = re.search(
-        r"Presupuesto.*?([\d\.]+,\d{2})",
-        text,
-        re.IGNORECASE
-    )
-    if m:
-        try:
-            out["budgetWithoutVAT"] = float(
-                m.group(1)
-                .replace(".", "")
-                .replace(",", ".")
-            )
-        except Exception:
-            pass
-
-    # 🏛 ÓRGANO DE CONTRATACIÓN
-    m = re.search(
-        r"Órgano de contratación\s*([^·]+)",
-        text,
-        re.IGNORECASE
-    )
-    if m:
-        out["entity"] = {"name": m.group(1).strip()}
-
-    return out
-
-
 def extract_deadline(text: str):
     if not text:
         return None
@@ -136,7 +62,7 @@ def extract_deadline(text: str):
         return None
 
     try:
-        return datetime.strptime(m.group(1), "%d/%m/%Y").date().isoformat()
+        return datetime.strptime(m.group(1), "%d/%m/%Y").date()
     except Exception:
         return None
 
@@ -199,53 +125,60 @@ RSS_URLS = {
 # LOAD CONTRACTS DESDE RSS
 # =========================
 
-async def load_contracts(contrato, estado):
-    """
-    contrato: OBR | SERV | ING
-    estado: ABI | PLZ | CER
-    """
-
-    rss_contrato = "SERV" if contrato == "ING" else contrato
-    rss_estado = "ABI" if estado == "PLZ" else estado
-    rss_url = RSS_URLS[(rss_contrato, rss_estado)]
-
-    feed = feedparser.parse(
-        rss_url,
-        request_headers={
-            "User-Agent": "Mozilla/5.0 (compatible; OCGIPBOT/1.0)"
-        }
-    )
+def feed_items(entries):
     items = []
 
-    print(f"[RSS] {rss_url} -> {len(feed.entries)} entradas")
-
-    for e in feed.entries:
-        item = {
-            "id": e.get("id") or e.get("link"),
-            "object": e.get("title", "").strip(),
-            "entity": {"name": "Contratación Euskadi"},
-            "firstPublicationDate": (
-                datetime(*e.published_parsed[:6]).date().isoformat()
+    for e in entries:
+        item = NoticeItem(
+            id=e.get("id") or e.get("link"),
+            object=e.get("title", "").strip(),
+            entity="Contratación Euskadi",
+            first_publication_date=(
+                datetime(*e.published_parsed[:6]).date()
                 if getattr(e, "published_parsed", None)
                 else None
             ),
-            "deadlineDate": None,
-            "budgetWithoutVAT": None,
-            "mainEntityOfPage": e.get("link"),
-        }
+            url=e.get("link"),
+        )
+        items.append(item)
 
-        # 🔥 ENRIQUECER DESDE HTML (OPCIONAL)
-        if ENRICH_FROM_HTML and item["mainEntityOfPage"]:
-            extra = await scrape_notice(item["mainEntityOfPage"])
-            item.update(extra)
+    return items
 
 
-        items.append(item)
+async def build_snapshot(rss_contrato, rss_estado, previous=None):
+    """
+    Items del feed ya clasificados, o None si el feed no ha cambiado
+    (304) y `previous` sigue valiendo.
+    """
+    rss_url = RSS_URLS[(rss_contrato, rss_estado)]
+    entries, modified = await fetch_entries(rss_url)
+    if not modified and previous is not None:
+        return None
 
+    items = feed_items(entries)
 
+    # clasificación ING una sola vez por snapshot
+    for item, c in zip(items, classify_batch(items)):
+        item.is_ingenieria = c.is_ing
 
+    # 🔥 ENRIQUECER DESDE HTML (OPCIONAL)
+    if ENRICH_FROM_HTML:
+        await enrich_items(items)
 
-    return {"items": items}
+    return items
+
+
+async def load_contracts(contrato, estado):
+    """
+    contrato: OBR | SERV | ING
+    estado: ABI | PLZ | CER
+    """
+
+    rss_contrato = "SERV" if contrato == "ING" else contrato
+    rss_estado = "ABI" if estado == "PLZ" else estado
+
+    snapshot = await get_snapshot(rss_contrato, rss_estado)
+    return {"items": snapshot.items}
 
 
 # =========================
@@ -253,46 +186,122 @@ async def load_contracts(contrato, estado):
 # =========================
 async def safe_edit(message, text: str, **kwargs):
     kwargs.pop("parse_mode", None)  # 🔥 fuerza texto plano
-    try:
-        await message.edit_text(text, **kwargs)
-    except TelegramBadRequest as e:
-        if "message is not modified" in str(e):
-            return
-        raise
+    # la edición sale por la capa de envíos (rate limit + retry_after) y
+    # no se espera: clicks seguidos sobre el mismo mensaje se funden en
+    # la última edición; "message is not modified" se ignora allí
+    outbound.schedule_edit(message, text, **kwargs)
 
 
 # =========================
-# CACHE EN MEMORIA
+# CACHE EN MEMORIA (SNAPSHOTS RSS)
 # =========================
-CACHE = {}
+# Un snapshot por feed (rss_contrato, rss_estado). Todas las vistas
+# (ABI/PLZ, SERV/ING) y todas sus páginas leen del mismo snapshot.
+CACHE = OrderedDict()
 CACHE_TTL = 900  # 15 minutos
+CACHE_MAX_SIZE = 16
 SUMMARY_PAGE_SIZE = 4
 
+# si el feed falla se sirve el último snapshot bueno y no se reintenta
+# la descarga hasta pasado este margen
+CACHE_RETRY_AFTER = 60
+
+# peticiones en curso: clicks simultáneos comparten una sola descarga
+INFLIGHT = {}
+
+_snapshot_version = 0
+
+
+class Snapshot:
+    __slots__ = ("items", "version", "ts")
+
+    def __init__(self, items, version, ts):
+        self.items = items
+        self.version = version
+        self.ts = ts
+
 
 def get_cache(key):
+    # caducado no se borra: queda como último snapshot bueno si el feed falla
     v = CACHE.get(key)
     if not v:
         return None
-    ts, data = v
-    if time.time() - ts > CACHE_TTL:
-        CACHE.pop(key, None)
+    if time.time() - v.ts > CACHE_TTL:
         return None
-    return data
+    CACHE.move_to_end(key)
+    return v
+
+
+def set_cache(key, items):
+    global _snapshot_version
+    _snapshot_version += 1
+
+    snapshot = Snapshot(items, _snapshot_version, time.time())
+    CACHE[key] = snapshot
+    CACHE.move_to_end(key)
+
+    while len(CACHE) > CACHE_MAX_SIZE:
+        CACHE.popitem(last=False)
+
+    return snapshot
+
+
+async def _refresh_snapshot(key):
+    try:
+        previous = CACHE.get(key)
+        items = await build_snapshot(*key, previous=previous)
+        if items is None:
+            # 304: mismo snapshot y misma versión, solo se renueva el TTL
+            previous.ts = time.time()
+            CACHE.move_to_end(key)
+            return previous
+        return set_cache(key, items)
+    except httpx.HTTPError as exc:
+        stale = CACHE.get(key)
+        log.warning(
+            "⚠️ Feed RSS %s falló (%r): %s",
+            key, exc,
+            "se sirve el último snapshot" if stale else "sin snapshot previo",
+        )
+        if stale is None:
+            # sin datos previos: vista vacía (no se cachea, se reintenta)
+            return Snapshot([], 0, time.time())
+        # misma versión: vistas y páginas ya calculadas siguen valiendo
+        stale.ts = time.time() - CACHE_TTL + CACHE_RETRY_AFTER
+        CACHE.move_to_end(key)
+        return stale
+    finally:
+        INFLIGHT.pop(key, None)
+
+
+async def get_snapshot(rss_contrato, rss_estado, force=False):
+    key = (rss_contrato, rss_estado)
+
+    if not force:
+        snapshot = get_cache(key)
+        if snapshot is not None:
+            return snapshot
+
+    task = INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_refresh_snapshot(key))
+        INFLIGHT[key] = task
 
-def set_cache(key, data):
-    CACHE[key] = (time.time(), data)
+    # shield: si un click se cancela, la descarga sigue para los demás
+    return await asyncio.shield(task)
 
-# 👉 pon aquí TU chat (puede ser grupo o privado)
-ALERT_CHAT_ID = -1003637338441  # <-- CAMBIA ESTO
+# 👉 chat de alertas (grupo o privado): variable de entorno ALERT_CHAT_ID
+ALERT_CHAT_ID = settings.ALERT_CHAT_ID
 
 
 # =========================
 # FORMATOS
 # =========================
 def fmt_date(d):
+    # d: date / datetime ya parseados al ingerir
     if not d:
         return "—"
-    return datetime.fromisoformat(d[:10]).strftime("%d/%m/%Y")
+    return d.strftime("%d/%m/%Y")
 
 def fmt_money(x):
     if x is None:
@@ -304,108 +313,27 @@ def get_notice_url(it):
     Devuelve SIEMPRE el enlace correcto al anuncio.
     Nunca el del poder adjudicador.
     """
-    # 1️⃣ enlace público del anuncio (el bueno)
-    if it.get("mainEntityOfPage"):
-        return it["mainEntityOfPage"]
-
-    # 2️⃣ fallback: enlace API del notice
-    self_link = ((it.get("_links") or {}).get("self") or {}).get("href")
-    if self_link:
-        return self_link
-
-    return None
-
-# =========================
-# FILTRO SERVICIOS – INGENIERÍAS
-# =========================
-
-ING_POSITIVE = [
-    # ingeniería general
-    "INGENIER",
-    "INGENIERIA",
-    "ING",
-
-    # proyectos
-    "PROYECT",
-    "REDACCION",
-    "ESTUDIO",
-    "MEMORIA",
-    "CALCULO",
-
-    # obra
-    "DIRECCION OBRA",
-    "DIR OBRA",
-    "ASISTENCIA TECNICA",
-    "ASIST TECN",
-    "CONTROL OBRA",
-    "SUPERVISION",
-
-    # especialidades
-    "ELECTRIC",
-    "INSTALACION",
-    "CLIMATIZACION",
-    "SANEAMIENTO",
-    "AGUA",
-    "DEPURADORA",
-    "ABASTECIMIENTO",
-    "URBANIZACION",
-    "ESTRUCTURA",
-    "CARRETERA",
-    "CAMINO",
-]
-ING_NEGATIVE = [
-    "LIMPIEZA",
-    "CARPINTERIA",
-    "VIGILANCIA",
-    "SEGURIDAD PRIVADA",
-    "ATENCION",
-    "CONTROL DE ACCESO",
-    "GESTION",
-    "EDUCATIVO",
-    "SOCIAL",
-    "CULTURAL",
-    "ESCENICA",
-    "MUSEO",
-    "ALUMNADO",
-]
-
-def is_ingenieria(it):
-    txt = normalize_text(it.get("object", ""))
-
-    if not any(k in txt for k in ING_POSITIVE):
-        return False
-
-    if any(k in txt for k in ING_NEGATIVE):
-        return False
-
-    return True
-
-
+    # enlace público del anuncio (mainEntityOfPage / link del RSS)
+    return it.url or None
 
 def filter_en_plazo(items):
     today = datetime.utcnow().date()
     out = []
 
     for it in items:
-        d = it.get("deadlineDate")
+        d = it.deadline_date
 
         # ⚠️ si no hay deadline, NO se descarta
         if not d:
             out.append(it)
             continue
 
-        try:
-            if datetime.fromisoformat(d[:10]).date() >= today:
-                out.append(it)
-        except Exception:
-            pass
+        if d >= today:
+            out.append(it)
 
     return out
 
 
-BIG_AMOUNT = 1_000_000
-ALERT_DAYS = 7
-
 def apply_filters(items, contrato, estado):
     out = items
 
@@ -413,42 +341,33 @@ def apply_filters(items, contrato, estado):
         out = filter_en_plazo(out)
 
     if contrato == "ING":
-        out = [it for it in out if is_ingenieria(it)]
+        out = [it for it in out if it.is_ingenieria]
 
     return out
 
 
-def group_and_sort(items):
-    grouped = {}
-
-    for it in items:
-        ent = (it.get("entity") or {}).get("name", "OTROS")
-        grouped.setdefault(ent, []).append(it)
-
-    # ordenar entidades y contratos
-    entities = []
-    for ent, its in grouped.items():
-        its_sorted = sorted(
-            its,
-            key=lambda x: x.get("deadlineDate") or "9999-12-31"
-        )
-        entities.append((ent, its_sorted))
+async def get_view_items(contrato, estado, db: AsyncSession = None):
+    """
+    Items ya filtrados de una vista. Si la BD local tiene anuncios de ese
+    tipo se consulta la BD; si no (p.ej. antes de la primera
+    sincronización), se cae al RSS en vivo.
+    """
+    if db is not None and await queries.has_notices(db, contrato):
+        return await queries.load_view_items(db, contrato, estado)
 
-    return sorted(entities, key=lambda x: x[0])
+    data = await load_contracts(contrato, estado)
+    items = data.get("items", [])
+    return apply_filters(items, contrato, estado)
 
 
 # =========================
 # RESUMEN (SIN LÍMITES)
 # =========================
-def build_summary_page(entities, kind, mode, summary_page, summary_page_size=4):
-    total_pages = (len(entities) + summary_page_size - 1) // summary_page_size
+def build_summary_page(batch, kind, mode, summary_page, summary_page_size=4):
+    total_pages = (len(batch) + summary_page_size - 1) // summary_page_size
 
-    block = entities[
-        summary_page * summary_page_size :
-        (summary_page + 1) * summary_page_size
-    ]
-
-    today = datetime.utcnow().date()
+    first = summary_page * summary_page_size
+    block = range(first, min(first + summary_page_size, len(batch)))
 
     lines = [
         "━━━━━━━━━━━━━━━━━━━━",
@@ -456,38 +375,16 @@ def build_summary_page(entities, kind, mode, summary_page, summary_page_size=4):
         "━━━━━━━━━━━━━━━━━━━━",
     ]
 
-    for entity, items in block:
-        lines.append(f"\n📜 **{entity.upper()}**")
-        total = 0.0
+    for e in block:
+        lines.append(f"\n📜 **{batch.entity_names[e].upper()}**")
 
-        items_sorted = sorted(
-            items,
-            key=lambda x: x.get("deadlineDate") or "9999-12-31"
-        )
-
-        for it in items_sorted:
-            published = fmt_date(it.get("firstPublicationDate"))
-            deadline_raw = it.get("deadlineDate")
-            deadline = fmt_date(deadline_raw)
-            amount = it.get("budgetWithoutVAT")
-            money = fmt_money(amount)
-
-            if amount:
-                total += amount
-
-            alert = ""
-            if deadline_raw:
-                try:
-                    d = datetime.fromisoformat(deadline_raw[:10]).date()
-                    if (d - today).days <= ALERT_DAYS:
-                        alert = " ❗"
-                except Exception:
-                    pass
+        # items ya ordenados por deadline; el TOTAL acumulado sale del lote
+        totals = batch.running_totals(e)
+        for it, total in zip(batch.entity_items(e), totals):
+            published = fmt_date(it.first_publication_date)
 
-            icon = "💎" if amount and amount >= BIG_AMOUNT else "💵"
-
-            lines.append(f"• {published} · {it.get('object','(Sin título)')}")
-            lines.append(f"🏷 TOTAL: {fmt_money(total)}")
+            lines.append(f"• {published} · {it.object}")
+            lines.append(f"🏷 TOTAL: {fmt_money(float(total))}")
 
     lines.append(
         f"\n📄 _Resumen · Página {summary_page+1}/{total_pages}_"
@@ -549,24 +446,34 @@ def kb_vista(contrato: str, estado: str):
     kb.adjust(2, 2)
     return kb.as_markup()
 
-def kb_detalle_nav(contrato, estado, page, total_pages):
+def _nav_data(token, vista, page, contrato, estado):
+    # con token: navegación sobre el resultado ya materializado
+    if token:
+        return view_state.pack(token, vista, page, contrato, estado)
+    if page is None:
+        return f"v:{contrato}:{estado}:{vista}"
+    prefix = "respage" if vista == V_RES else "detpage"
+    return f"{prefix}:{contrato}:{estado}:{page}"
+
+
+def kb_detalle_nav(contrato, estado, page, total_pages, token=None):
     kb = InlineKeyboardBuilder()
 
     if page > 0:
         kb.button(
             text="◁",
-            callback_data=f"detpage:{contrato}:{estado}:{page-1}"
+            callback_data=_nav_data(token, V_DET, page - 1, contrato, estado)
         )
     if page < total_pages - 1:
         kb.button(
             text="▷",
-            callback_data=f"detpage:{contrato}:{estado}:{page+1}"
+            callback_data=_nav_data(token, V_DET, page + 1, contrato, estado)
         )
 
     # 📋 CAMBIO DE VISTA
     kb.button(
         text="📋 Resumen",
-        callback_data=f"v:{contrato}:{estado}:RES"
+        callback_data=_nav_data(token, V_RES, None if token is None else 0, contrato, estado)
     )
 
     kb.button(text="🏠", callback_data="home")
@@ -576,25 +483,25 @@ def kb_detalle_nav(contrato, estado, page, total_pages):
     return kb.as_markup()
 
 
-def kb_resumen_nav(contrato, estado, page, total_pages):
+def kb_resumen_nav(contrato, estado, page, total_pages, token=None):
     kb = InlineKeyboardBuilder()
 
     # navegación
     if page > 0:
         kb.button(
             text="◁",
-            callback_data=f"respage:{contrato}:{estado}:{page-1}"
+            callback_data=_nav_data(token, V_RES, page - 1, contrato, estado)
         )
     if page < total_pages - 1:
         kb.button(
             text="▷",
-            callback_data=f"respage:{contrato}:{estado}:{page+1}"
+            callback_data=_nav_data(token, V_RES, page + 1, contrato, estado)
         )
 
     # 🔍 CAMBIO DE VISTA
     kb.button(
         text="🔍 Detalle",
-        callback_data=f"v:{contrato}:{estado}:DET"
+        callback_data=_nav_data(token, V_DET, None if token is None else 0, contrato, estado)
     )
 
     # acciones globales
@@ -611,7 +518,8 @@ def kb_resumen_nav(contrato, estado, page, total_pages):
 # =========================
 @router.message(F.text == "/start")
 async def start_cmd(msg: Message):
-    await msg.answer(
+    await outbound.answer(
+        msg,
         "💼 **CONTRATO**",
         reply_markup=kb_start(),
         parse_mode="Markdown"
@@ -653,130 +561,162 @@ async def pick_estado(cb: CallbackQuery):
 
 
 @router.callback_query(F.data.startswith("v:"))
-async def pick_vista(cb: CallbackQuery):
+async def pick_vista(cb: CallbackQuery, db: AsyncSession):
     _, contrato, estado, vista = cb.data.split(":")
+    await show_view_page(cb, vista, contrato, estado, 0, db)
 
-    header = build_header(vista, contrato, estado)
 
-    data = await load_contracts(contrato, estado)
-    items = data.get("items", [])
+@router.callback_query(F.data.startswith(f"{view_state.CALLBACK_PREFIX}:"))
+async def view_state_page(cb: CallbackQuery, db: AsyncSession):
+    token, vista, page, contrato, estado = view_state.unpack(cb.data)
+    await show_view_page(cb, vista, contrato, estado, page, db, token=token)
+
+
+# callbacks sin token (mensajes enviados antes de los tokens de vista)
+@router.callback_query(F.data.startswith("respage:"))
+async def change_res_page(cb: CallbackQuery, db: AsyncSession):
+    _, contrato, estado, page = cb.data.split(":")
+    await show_view_page(cb, V_RES, contrato, estado, int(page), db)
+
+
+@router.callback_query(F.data.startswith("detpage:"))
+async def change_det_page(cb: CallbackQuery, db: AsyncSession):
+    _, contrato, estado, page = cb.data.split(":")
+    await show_view_page(cb, V_DET, contrato, estado, int(page), db)
+
+
+# =========================
+# CACHE DE PÁGINAS RENDERIZADAS
+# =========================
+# (vista, contrato, estado, página, token de vista) -> (texto, teclado)
+PAGE_CACHE = OrderedDict()
+PAGE_CACHE_MAX_SIZE = 256
+
+
+
+async def get_view_version(contrato, estado, db: AsyncSession = None):
+    """
+    Versión de los datos que hay detrás de una vista: la de la BD local
+    o la del snapshot RSS. Cambia cada vez que cambian los datos.
+    """
+    if db is not None and await queries.has_notices(db, contrato):
+        return ("db", queries.data_version())
+
+    rss_contrato = "SERV" if contrato == "ING" else contrato
+    rss_estado = "ABI" if estado == "PLZ" else estado
+    snapshot = await get_snapshot(rss_contrato, rss_estado)
+    return ("rss", snapshot.version)
 
-    items = apply_filters(items, contrato, estado)
-    entities = group_and_sort(items)
 
-    if not entities:
-        await safe_edit(
-            cb.message,
+# =========================
+# ÍNDICE AGRUPADO POR VISTA
+# =========================
+# (contrato, estado) -> (versión, día, ItemBatch): items agrupados por
+# entidad y ordenados por deadline, compartidos por RES, DET, todas sus
+# páginas y las alertas. Solo se reordena si cambian los datos (o el día,
+# que mueve el filtro PLZ y los avisos de plazo).
+VIEW_INDEX = {}
+
+
+async def get_view_batch(contrato, estado, db: AsyncSession = None, version=None):
+    if version is None:
+        version = await get_view_version(contrato, estado, db)
+    today = datetime.utcnow().date()
+
+    hit = VIEW_INDEX.get((contrato, estado))
+    if hit is not None and hit[0] == version and hit[1] == today:
+        return hit[2]
+
+    items = await get_view_items(contrato, estado, db)
+    batch = ItemBatch(items, today)
+    VIEW_INDEX[(contrato, estado)] = (version, today, batch)
+    return batch
+
+
+def get_page(key):
+    hit = PAGE_CACHE.get(key)
+    if hit is not None:
+        PAGE_CACHE.move_to_end(key)
+    return hit
+
+
+def set_page(key, rendered):
+    # cada token fija un resultado inmutable: sus páginas no caducan por
+    # datos nuevos, solo salen por LRU
+    PAGE_CACHE[key] = rendered
+    while len(PAGE_CACHE) > PAGE_CACHE_MAX_SIZE:
+        PAGE_CACHE.popitem(last=False)
+
+
+def build_view_page(vista, contrato, estado, batch, page, token=None):
+    if not len(batch):
+        header = build_header(vista, contrato, estado)
+        return (
             f"{header}\n\nℹ️ No hay resultados.",
-            parse_mode="Markdown",
-            reply_markup=kb_vista(contrato, estado)
+            kb_vista(contrato, estado),
         )
-        return
 
-    # RESUMEN
-    if vista == "RES":
-        text, total_pages = build_summary_page(
-            entities,
+    if vista == V_RES:
+        total_pages = (len(batch) + SUMMARY_PAGE_SIZE - 1) // SUMMARY_PAGE_SIZE
+
+        # 🔒 CLAMP REAL (ESTO ES LA CLAVE)
+        page = min(max(page, 0), total_pages - 1)
+
+        text, _ = build_summary_page(
+            batch,
             contrato,
             estado,
-            summary_page=0,
+            summary_page=page,
             summary_page_size=SUMMARY_PAGE_SIZE
         )
+        return text, kb_resumen_nav(contrato, estado, page, total_pages, token)
 
-        await safe_edit(
-            cb.message,
-            text,
-            parse_mode="Markdown",
-            reply_markup=kb_resumen_nav(contrato, estado, 0, total_pages),
-            disable_web_page_preview=True
-        )
-        return
-
-    # DETALLE
-    await render_page(
-        cb,
-        kind=contrato,
-        mode=estado,
-        entities=entities,
-        page=0,
-        page_size=2
+    text, page, total_pages = build_detail_page(
+        batch, contrato, estado, page, page_size=DETAIL_PAGE_SIZE
     )
+    return text, kb_detalle_nav(contrato, estado, page, total_pages, token)
 
-@router.callback_query(F.data.startswith("respage:"))
-async def change_res_page(cb: CallbackQuery):
-    _, contrato, estado, page = cb.data.split(":")
-    page = int(page)
-
-    data = await load_contracts(contrato, estado)
-    items = data.get("items", [])
-
-    items = apply_filters(items, contrato, estado)
-    entities = group_and_sort(items)
-
-    if not entities:
-        await safe_edit(
-            cb.message,
-            "ℹ️ No hay resultados.",
-            parse_mode="Markdown",
-            reply_markup=kb_resumen_nav(contrato, estado, 0, 1)
-        )
-        return
 
-    total_pages = (len(entities) + SUMMARY_PAGE_SIZE - 1) // SUMMARY_PAGE_SIZE
+async def show_view_page(cb, vista, contrato, estado, page, db: AsyncSession = None, token=None):
+    """
+    Un cambio de página es una consulta al diccionario + un edit_text.
+    Con un token de vista vivo se pagina sobre su lote ya materializado
+    (sin tocar RSS ni BD); sin token, o caducado, se abre la vista sobre
+    los datos actuales y se emite token nuevo.
+    """
+    state = view_state.get(token) if token else None
+    if state is None or (state.contrato, state.estado) != (contrato, estado):
+        batch = await get_view_batch(contrato, estado, db)
+        token = view_state.issue(contrato, estado, batch)
+    else:
+        batch = state.batch
 
-    # 🔒 CLAMP REAL (ESTO ES LA CLAVE)
-    if page < 0:
-        page = 0
-    elif page >= total_pages:
-        page = total_pages - 1
+    key = (vista, contrato, estado, page, token)
 
-    text, _ = build_summary_page(
-        entities,
-        contrato,
-        estado,
-        summary_page=page,
-        summary_page_size=SUMMARY_PAGE_SIZE
-    )
+    rendered = get_page(key)
+    if rendered is None:
+        rendered = build_view_page(vista, contrato, estado, batch, page, token)
+        set_page(key, rendered)
 
+    text, markup = rendered
     await safe_edit(
         cb.message,
         text,
         parse_mode="Markdown",
-        reply_markup=kb_resumen_nav(
-            contrato, estado, page, total_pages
-        ),
+        reply_markup=markup,
         disable_web_page_preview=True
     )
+    await cb.answer()
 
 
-@router.callback_query(F.data.startswith("detpage:"))
-async def change_det_page(cb: CallbackQuery):
-    _, contrato, estado, page = cb.data.split(":")
-    page = int(page)
-
-    data = await load_contracts(contrato, estado)
-    items = data.get("items", [])
-
-    items = apply_filters(items, contrato, estado)
-    entities = group_and_sort(items)
-
-    await render_page(
-        cb,
-        kind=contrato,
-        mode=estado,
-        entities=entities,
-        page=page,
-        page_size=2,
-    )
-
 # =========================
 # RENDER DETALLE
 # =========================
-async def render_page(cb, kind, mode, entities, page, page_size=2):
-    is_callback = hasattr(cb, "message")
-    message = cb.message if is_callback else cb
+DETAIL_PAGE_SIZE = 2
+
 
-    total_pages = (len(entities) + page_size - 1) // page_size
+def build_detail_page(batch, kind, mode, page, page_size=DETAIL_PAGE_SIZE):
+    total_pages = (len(batch) + page_size - 1) // page_size
     if total_pages <= 0:
         total_pages = 1
 
@@ -785,23 +725,23 @@ async def render_page(cb, kind, mode, entities, page, page_size=2):
     elif page >= total_pages:
         page = total_pages - 1
 
-    block = entities[page*page_size:(page+1)*page_size]
+    block = range(page*page_size, min((page+1)*page_size, len(batch)))
 
     lines = []
     counter = 1 + page * page_size
 
-    for entity, items in block:
-        lines.append(f"__**{entity.upper()}**__\n")
+    for e in block:
+        lines.append(f"__**{batch.entity_names[e].upper()}**__\n")
 
-        for it in items:
+        for it in batch.entity_items(e):
             url = get_notice_url(it)
             link = f"🔗 {url}" if url else "🔗 —"
 
             lines.append(
-                f"{counter}️⃣ {it.get('object','(Sin título)')}\n"
-                f"⏱️ DESDE: {fmt_date(it.get('firstPublicationDate'))}\n"
-                f"⏰🖊 HASTA: {fmt_date(it.get('deadlineDate'))}\n"
-                f"💰 {fmt_money(it.get('budgetWithoutVAT'))}\n"
+                f"{counter}️⃣ {it.object}\n"
+                f"⏱️ DESDE: {fmt_date(it.first_publication_date)}\n"
+                f"⏰🖊 HASTA: {fmt_date(it.deadline_date)}\n"
+                f"💰 {fmt_money(it.budget)}\n"
                 f"{link}\n"
             )
             counter += 1
@@ -815,26 +755,168 @@ async def render_page(cb, kind, mode, entities, page, page_size=2):
         + f"\n\n📄 _Página {page+1}/{total_pages}_"
     )
 
-    if is_callback:
-        await safe_edit(
-            message,
-            text,
-            parse_mode="Markdown",
-            reply_markup=kb_detalle_nav(kind, mode, page, total_pages),
-            disable_web_page_preview=True
+    return text, page, total_pages
+
+
+# =========================
+# SUSCRIPCIONES
+# =========================
+@router.message(F.text.startswith("/suscribir"))
+async def subscribe_cmd(msg: Message, db: AsyncSession):
+    args = msg.text.partition(" ")[2]
+    try:
+        crit = subscriptions.parse_subscription(args)
+        sub = await subscriptions.add_subscription(db, msg.chat.id, crit)
+    except ValueError as e:
+        await outbound.answer(
+            msg,
+            f"⚠️ {e}\n\n"
+            "Uso: /suscribir [OBR|SERV|ING] [min=IMPORTE] [org=ORGANISMO] [palabras]\n"
+            "Ej.: /suscribir SERV min=50000 org=donostia redaccion proyecto",
+            parse_mode=None
         )
-        await cb.answer()
+        return
+
+    await outbound.answer(
+        msg,
+        f"✅ Suscripción #{sub.id}: {subscriptions.describe(sub)}",
+        parse_mode=None
+    )
+
+
+@router.message(F.text == "/suscripciones")
+async def list_subscriptions_cmd(msg: Message, db: AsyncSession):
+    subs = await subscriptions.list_subscriptions(db, msg.chat.id)
+    if not subs:
+        await outbound.answer(msg, "📭 Sin suscripciones. Usa /suscribir", parse_mode=None)
+        return
+
+    lines = [f"#{s.id} · {subscriptions.describe(s)}" for s in subs]
+    await outbound.answer(
+        msg,
+        "🔔 Suscripciones:\n" + "\n".join(lines) + "\n\n/baja ID · /baja todo",
+        parse_mode=None
+    )
+
+
+@router.message(F.text.startswith("/baja"))
+async def unsubscribe_cmd(msg: Message, db: AsyncSession):
+    arg = msg.text.partition(" ")[2].strip().lower()
+    if arg == "todo":
+        sub_id = None
+    elif arg.lstrip("#").isdigit():
+        sub_id = int(arg.lstrip("#"))
     else:
-        await message.answer(
-            text,
-            parse_mode="Markdown",
-            reply_markup=kb_detalle_nav(kind, mode, page, total_pages),
-            disable_web_page_preview=True
+        await outbound.answer(msg, "Uso: /baja ID · /baja todo", parse_mode=None)
+        return
+
+    removed = await subscriptions.remove_subscription(db, msg.chat.id, sub_id)
+    await outbound.answer(
+        msg,
+        f"🗑 {removed} suscripción(es) eliminada(s)" if removed else "⚠️ No encontrada",
+        parse_mode=None
+    )
+
+
+# =========================
+# BÚSQUEDA (/buscar)
+# =========================
+SEARCH_PAGE_SIZE = 5
+
+
+def kb_search_nav(token, page, total_pages):
+    kb = InlineKeyboardBuilder()
+    if page > 0:
+        kb.button(text="◁", callback_data=f"bq:{token}:{page-1}")
+    if page < total_pages - 1:
+        kb.button(text="▷", callback_data=f"bq:{token}:{page+1}")
+    kb.button(text="🏠", callback_data="home")
+    kb.adjust(2, 1)
+    return kb.as_markup()
+
+
+def build_search_page(result, items, page, total_pages):
+    lines = [
+        "━━━━━━━━━━━━━━━━━━━━",
+        f"🔎 **BUSCAR — {result.query}**",
+        "━━━━━━━━━━━━━━━━━━━━",
+        f"{result.total} resultados"
+        + (f" (se muestran {len(result.ids)})" if result.total > len(result.ids) else ""),
+        "",
+    ]
+
+    counter = 1 + page * SEARCH_PAGE_SIZE
+    for it in items:
+        url = get_notice_url(it)
+        lines.append(
+            f"{counter}️⃣ {it.object}\n"
+            f"🏛 {it.entity}\n"
+            f"⏰🖊 HASTA: {fmt_date(it.deadline_date)} · 💰 {fmt_money(it.budget)}\n"
+            f"🔗 {url or '—'}\n"
         )
+        counter += 1
+
+    lines.append(f"📄 _Página {page+1}/{total_pages}_")
+    return "\n".join(lines)
+
+
+async def render_search_page(db: AsyncSession, token, result, page):
+    total_pages = max(1, (len(result.ids) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE)
+    page = min(max(page, 0), total_pages - 1)
+
+    # solo se leen de BD los anuncios de la página
+    ids = result.ids[page * SEARCH_PAGE_SIZE:(page + 1) * SEARCH_PAGE_SIZE]
+    items = await search.load_items(db, ids)
+
+    text = build_search_page(result, items, page, total_pages)
+    return text, kb_search_nav(token, page, total_pages)
+
+
+@router.message(F.text.startswith("/buscar"))
+async def search_cmd(msg: Message, db: AsyncSession):
+    query = msg.text.partition(" ")[2].strip()
+    if not query:
+        await outbound.answer(msg, "Uso: /buscar palabras (ej.: /buscar redaccion proyecto irun)", parse_mode=None)
+        return
+
+    total, ids = await search.search(db, query)
+    if not ids:
+        await outbound.answer(msg, f"🔎 Sin resultados para «{query}»", parse_mode=None)
+        return
+
+    token = search.store_result(query, total, ids)
+    text, markup = await render_search_page(db, token, search.get_result(token), 0)
+    await outbound.answer(
+        msg,
+        text,
+        reply_markup=markup,
+        disable_web_page_preview=True,
+        parse_mode=None
+    )
+
+
+@router.callback_query(F.data.startswith("bq:"))
+async def search_page(cb: CallbackQuery, db: AsyncSession):
+    _, token, page = cb.data.split(":")
+    result = search.get_result(token)
+    if result is None:
+        await cb.answer("⌛ Búsqueda caducada: repite /buscar", show_alert=True)
+        return
+
+    text, markup = await render_search_page(db, token, result, int(page))
+    await safe_edit(
+        cb.message,
+        text,
+        reply_markup=markup,
+        disable_web_page_preview=True
+    )
+    await cb.answer()
+
 
 @router.message(F.text == "/chatid")
 async def show_chat_id(msg: Message):
-    await msg.answer(
+    await outbound.answer(
+        msg,
         f"CHAT_ID = {msg.chat.id}",
         parse_mode=None
     )
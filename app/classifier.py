@@ -0,0 +1,205 @@
+import hashlib
+import re
+import sys
+import unicodedata
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9 ]+")
+
+
+# tabla para str.translate: elimina todas las marcas diacríticas (Mn)
+_STRIP_MN = {
+    cp: None
+    for cp in range(sys.maxunicode + 1)
+    if unicodedata.category(chr(cp)) == "Mn"
+}
+
+
+def normalize_text(s: str) -> str:
+    if not s:
+        return ""
+    if not s.isascii():
+        s = unicodedata.normalize("NFD", s).translate(_STRIP_MN)
+    s = s.upper()
+    s = _NON_ALNUM.sub(" ", s)
+    return s
+
+
+# =========================
+# FILTRO SERVICIOS – INGENIERÍAS
+# =========================
+
+ING_POSITIVE = [
+    # ingeniería general
+    "INGENIER",
+    "INGENIERIA",
+    "ING",
+
+    # proyectos
+    "PROYECT",
+    "REDACCION",
+    "ESTUDIO",
+    "MEMORIA",
+    "CALCULO",
+
+    # obra
+    "DIRECCION OBRA",
+    "DIR OBRA",
+    "ASISTENCIA TECNICA",
+    "ASIST TECN",
+    "CONTROL OBRA",
+    "SUPERVISION",
+
+    # especialidades
+    "ELECTRIC",
+    "INSTALACION",
+    "CLIMATIZACION",
+    "SANEAMIENTO",
+    "AGUA",
+    "DEPURADORA",
+    "ABASTECIMIENTO",
+    "URBANIZACION",
+    "ESTRUCTURA",
+    "CARRETERA",
+    "CAMINO",
+]
+ING_NEGATIVE = [
+    "LIMPIEZA",
+    "CARPINTERIA",
+    "VIGILANCIA",
+    "SEGURIDAD PRIVADA",
+    "ATENCION",
+    "CONTROL DE ACCESO",
+    "GESTION",
+    "EDUCATIVO",
+    "SOCIAL",
+    "CULTURAL",
+    "ESCENICA",
+    "MUSEO",
+    "ALUMNADO",
+]
+
+
+# cambia cuando cambian las listas: dispara la reclasificación en BD
+RULES_VERSION = hashlib.sha1(
+    "\n".join(ING_POSITIVE + ["--"] + ING_NEGATIVE).encode()
+).hexdigest()[:12]
+
+
+# =========================
+# MOTOR DE CLASIFICACIÓN
+# =========================
+# Una sola regex por lista, construida como un trie (los prefijos comunes
+# se comparan una sola vez). En cada posición gana la palabra clave más
+# larga (INGENIERIA antes que INGENIER o ING).
+
+def _trie_pattern(node):
+    end = "" in node
+    alts = [
+        re.escape(ch) + _trie_pattern(child)
+        for ch, child in sorted(node.items())
+        if ch != ""
+    ]
+    if not alts:
+        return ""
+    body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+    if end:
+        return "(?:" + body + ")?"
+    return body
+
+
+def _keyword_regex(words):
+    trie = {}
+    for w in set(words):
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return re.compile(_trie_pattern(trie))
+
+
+RE_ING_POSITIVE = _keyword_regex(ING_POSITIVE)
+RE_ING_NEGATIVE = _keyword_regex(ING_NEGATIVE)
+
+# separador entre textos en modo lote: no aparece en ningún texto
+# normalizado ni en ninguna palabra clave
+_BATCH_SEP = "\n"
+
+Classification = namedtuple("Classification", "is_ing positive negative")
+
+# id de anuncio -> [texto original, texto normalizado, Classification]
+_CACHE = OrderedDict()
+CACHE_MAX_SIZE = 20_000
+
+
+def _fields(it):
+    # anuncios del bot (NoticeItem) o JSON crudo de la API (updater)
+    if isinstance(it, dict):
+        return it.get("object") or "", it.get("id")
+    return it.object or "", it.id
+
+
+def _entry(it):
+    raw, key = _fields(it)
+    if key is None:
+        return [raw, normalize_text(raw), None]
+
+    hit = _CACHE.get(key)
+    if hit is not None and hit[0] == raw:
+        _CACHE.move_to_end(key)
+        return hit
+
+    entry = [raw, normalize_text(raw), None]
+    _CACHE[key] = entry
+    if len(_CACHE) > CACHE_MAX_SIZE:
+        _CACHE.popitem(last=False)
+    return entry
+
+
+def normalized_object(it):
+    return _entry(it)[1]
+
+
+def _result(positive, negative):
+    return Classification(
+        bool(positive) and not negative,
+        tuple(sorted(positive)),
+        tuple(sorted(negative)),
+    )
+
+
+def _classify_texts(texts):
+    """
+    Una sola pasada de cada regex sobre los textos concatenados.
+    """
+    starts = []
+    pos = 0
+    for t in texts:
+        starts.append(pos)
+        pos += len(t) + len(_BATCH_SEP)
+
+    joined = _BATCH_SEP.join(texts)
+    found = [(set(), set()) for _ in texts]
+
+    for side, regex in ((0, RE_ING_POSITIVE), (1, RE_ING_NEGATIVE)):
+        for m in regex.finditer(joined):
+            i = bisect_right(starts, m.start()) - 1
+            found[i][side].add(m.group(0))
+
+    return [_result(p, n) for p, n in found]
+
+
+def classify_batch(items):
+    """
+    Clasifica un lote: los anuncios ya vistos salen de la caché y el
+    resto se resuelve en una sola pasada.
+    """
+    entries = [_entry(it) for it in items]
+    todo = [e for e in entries if e[2] is None]
+
+    if todo:
+        for e, c in zip(todo, _classify_texts([e[1] for e in todo])):
+            e[2] = c
+
+    return [e[2] for e in entries]
@@ -6,8 +6,28 @@ class Settings:
     BASE_URL = os.getenv("BASE_URL", "")
     TZ = os.getenv("TZ", "Europe/Madrid")
 
-    YEAR_FROM = "2025-01-01"
-    YEAR_TO = "2025-12-31"
+    YEAR_FROM = os.getenv("YEAR_FROM", "2025-01-01")
+    YEAR_TO = os.getenv("YEAR_TO", "2025-12-31")
+
+    # territorio (NUTS) de los feeds RSS (p26=ES212: Gipuzkoa); la BD
+    # solo guarda anuncios de este territorio
+    NUTS = os.getenv("NUTS", "ES212")
     ABIERTAS_FROM = "2025-10-01"
 
+    # scheduler
+    FEED_REFRESH_MINUTES = int(os.getenv("FEED_REFRESH_MINUTES", "10"))
+    UPDATE_HOURS = os.getenv("UPDATE_HOURS", "11,17")
+    SCHEDULER_JITTER = int(os.getenv("SCHEDULER_JITTER", "60"))  # segundos
+    ALERT_MINUTES = int(os.getenv("ALERT_MINUTES", "30"))
+
+    # grupo que recibe todos los avisos; sin él solo se avisa a los
+    # chats suscritos
+    ALERT_CHAT_ID = int(os.getenv("ALERT_CHAT_ID") or 0) or None
+
+    # api.euskadi.eus
+    EUSKADI_CONCURRENCY = int(os.getenv("EUSKADI_CONCURRENCY", "4"))
+
+    # sincronización incremental: reconciliación completa cada N horas
+    FULL_SYNC_HOURS = int(os.getenv("FULL_SYNC_HOURS", "24"))
+
 settings = Settings()
@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -7,12 +9,99 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no definida")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
-SessionLocal = sessionmaker(
-    autocommit=False,
+def async_url(url: str):
+    """
+    postgres:// / postgresql:// -> postgresql+asyncpg://
+    sqlite:// -> sqlite+aiosqlite://
+    """
+    connect_args = {}
+
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+
+    u = make_url(url)
+    backend = u.get_backend_name()
+
+    if backend == "postgresql":
+        u = u.set(drivername="postgresql+asyncpg")
+        # asyncpg no entiende sslmode (Render lo añade a la URL)
+        sslmode = u.query.get("sslmode")
+        if sslmode:
+            u = u.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+    elif backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+
+    return u, connect_args
+
+
+def engine_options(url):
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": 1800,
+    }
+
+
+_url, _connect_args = async_url(DATABASE_URL)
+
+engine = create_async_engine(
+    _url,
+    pool_pre_ping=True,
+    connect_args=_connect_args,
+    **engine_options(_url),
+)
+
+SessionLocal = async_sessionmaker(
+    engine,
     autoflush=False,
-    bind=engine,
+    expire_on_commit=False,
 )
 
 Base = declarative_base()
+
+
+def add_missing_columns(conn):
+    """
+    create_all no altera tablas existentes: añade las columnas nuevas
+    (siempre nullable) que falten en la base de datos.
+    """
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing:
+                continue
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.execute(text(
+                f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'
+            ))
+
+
+def create_missing_indexes(conn):
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(bind=conn, checkfirst=True)
+
+
+def _init_schema(conn):
+    from .migrations import run_migrations
+
+    Base.metadata.create_all(bind=conn)
+    add_missing_columns(conn)
+    create_missing_indexes(conn)
+    run_migrations(conn)
+
+
+async def init_db():
+    from . import models  # noqa: F401  (registra las tablas en Base)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(_init_schema)
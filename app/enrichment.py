@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import NoticeEnrichment
+from .records import intern_name
+from .rss_client import get_client
+from .updater import upsert_rows
+
+log = logging.getLogger(__name__)
+
+ENRICH_WORKERS = 4        # peticiones simultáneas en total
+HOST_MIN_INTERVAL = 0.5   # segundos entre peticiones al mismo host
+
+
+# =========================
+# RATE LIMIT POR HOST
+# =========================
+class HostRateLimiter:
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next = {}
+        self._locks = {}
+
+    async def wait(self, url):
+        host = urlsplit(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            delay = self._next.get(host, now) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = max(now, self._next.get(host, now)) + self.min_interval
+
+
+limiter = HostRateLimiter(HOST_MIN_INTERVAL)
+
+
+# =========================
+# EXTRACCIÓN
+# =========================
+# En la ficha del anuncio cada dato es una pareja etiqueta / valor en
+# nodos de texto consecutivos (dt/dd, th/td, label/span). Se recorre el
+# HTML en streaming, sin construir árbol ni aplanar todo el texto, y se
+# para en cuanto están los tres campos.
+
+RE_LABEL_DEADLINE = re.compile(r"Fecha límite", re.IGNORECASE)
+RE_LABEL_BUDGET = re.compile(r"Presupuesto", re.IGNORECASE)
+RE_LABEL_ENTITY = re.compile(r"Órgano de contratación", re.IGNORECASE)
+
+RE_VALUE_DATE = re.compile(r"(\d{2}/\d{2}/\d{4})")
+RE_VALUE_MONEY = re.compile(r"([\d\.]+,\d{2})")
+RE_VALUE_ENTITY = re.compile(r"([^·]+)")
+
+# nodos de texto en los que se busca el valor tras ver la etiqueta
+VALUE_WINDOW = 8
+
+# separadores sueltos (":", "-", "·") entre etiqueta y valor: no cuentan
+RE_PUNCT_ONLY = re.compile(r"[\W_]+")
+
+SKIP_TAGS = {"script", "style", "noscript", "head"}
+
+
+def _parse_date(s):
+    return datetime.strptime(s, "%d/%m/%Y").date()
+
+
+def _parse_money(s):
+    return float(s.replace(".", "").replace(",", "."))
+
+
+FIELDS = (
+    ("deadline_date", RE_LABEL_DEADLINE, RE_VALUE_DATE, _parse_date),
+    ("budget_without_vat", RE_LABEL_BUDGET, RE_VALUE_MONEY, _parse_money),
+    ("entity_name", RE_LABEL_ENTITY, RE_VALUE_ENTITY, str.strip),
+)
+
+
+class _Done(Exception):
+    pass
+
+
+class NoticeFieldParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = {}
+        self._skip = 0
+        self._pending = {}  # campo -> nodos de texto restantes
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        data = data.strip()
+        if not data or RE_PUNCT_ONLY.fullmatch(data):
+            return
+
+        labels = {
+            name: m
+            for name, re_label, _, _ in FIELDS
+            if (m := re_label.search(data))
+        }
+
+        for name, re_label, re_value, parse in FIELDS:
+            if name in self.out:
+                continue
+
+            m = labels.get(name)
+            if m:
+                rest = data[m.end():].lstrip(" :\t")
+                self._pending[name] = VALUE_WINDOW
+            elif name in self._pending:
+                if labels:
+                    # empieza otro campo: este no tenía valor
+                    del self._pending[name]
+                    continue
+                rest = data
+            else:
+                continue
+
+            v = re_value.search(rest)
+            value = None
+            if v and v.group(1).strip():
+                try:
+                    value = parse(v.group(1))
+                except ValueError:
+                    value = None
+
+            if value is not None:
+                self.out[name] = value
+                self._pending.pop(name, None)
+            elif not m:
+                self._pending[name] -= 1
+                if self._pending[name] <= 0:
+                    del self._pending[name]
+
+        if len(self.out) == len(FIELDS):
+            raise _Done
+
+
+def extract_notice_fields(html: str):
+    parser = NoticeFieldParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Done:
+        pass
+    return parser.out
+
+
+def to_item_fields(row):
+    """Fila de notice_enrichment -> atributos de un NoticeItem."""
+    out = {}
+    if row.get("deadline_date"):
+        out["deadline_date"] = row["deadline_date"]
+    if row.get("budget_without_vat") is not None:
+        out["budget"] = float(row["budget_without_vat"])
+    if row.get("entity_name"):
+        out["entity"] = intern_name(row["entity_name"])
+    return out
+
+
+# =========================
+# CACHÉ PERSISTENTE
+# =========================
+CACHE_COLUMNS = ("url", "content_hash", "deadline_date", "budget_without_vat", "entity_name")
+
+
+def _row_dict(r):
+    return {c: getattr(r, c) for c in CACHE_COLUMNS}
+
+
+async def load_cached(urls):
+    async with SessionLocal() as db:
+        rows = await db.scalars(
+            select(NoticeEnrichment).where(NoticeEnrichment.url.in_(urls))
+        )
+        return {r.url: _row_dict(r) for r in rows}
+
+
+async def find_by_hash(content_hash):
+    async with SessionLocal() as db:
+        r = (await db.scalars(
+            select(NoticeEnrichment)
+            .where(NoticeEnrichment.content_hash == content_hash)
+            .limit(1)
+        )).first()
+        return _row_dict(r) if r else None
+
+
+async def save_cached(rows):
+    async with SessionLocal() as db:
+        await upsert_rows(db, NoticeEnrichment, rows)
+        await db.commit()
+
+
+# =========================
+# SCRAPING
+# =========================
+async def scrape_notice(url: str):
+    """
+    Descarga y extrae un anuncio. Devuelve la fila para la caché o
+    None si la descarga falla.
+    """
+    await limiter.wait(url)
+    try:
+        r = await get_client().get(url, timeout=20)
+        r.raise_for_status()
+    except Exception as e:
+        log.warning("⚠️ scrape %s: %r", url, e)
+        return None
+
+    content_hash = hashlib.sha256(r.content).hexdigest()
+
+    # mismo contenido ya extraído con otra URL
+    known = await find_by_hash(content_hash)
+    fields = known or await asyncio.to_thread(extract_notice_fields, r.text)
+
+    return {
+        "url": url,
+        "content_hash": content_hash,
+        "deadline_date": fields.get("deadline_date"),
+        "budget_without_vat": fields.get("budget_without_vat"),
+        "entity_name": fields.get("entity_name"),
+        "scraped_at": datetime.utcnow(),
+    }
+
+
+async def enrich_items(items):
+    """
+    Completa deadline_date / budget / entity de los items desde
+    el HTML del anuncio. Cada URL se descarga una sola vez en su vida:
+    lo ya extraído sale de notice_enrichment.
+    """
+    by_url = {}
+    for it in items:
+        url = it.url
+        if url:
+            by_url.setdefault(url, []).append(it)
+    if not by_url:
+        return items
+
+    cached = await load_cached(list(by_url))
+
+    queue = asyncio.Queue()
+    for url in by_url:
+        if url not in cached:
+            queue.put_nowait(url)
+
+    fresh = []
+
+    async def worker():
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            row = await scrape_notice(url)
+            if row is not None:
+                cached[url] = row
+                fresh.append(row)
+
+    n_workers = min(ENRICH_WORKERS, queue.qsize())
+    if n_workers:
+        await asyncio.gather(*(worker() for _ in range(n_workers)))
+
+    if fresh:
+        await save_cached(fresh)
+        log.info("🔎 %s anuncios enriquecidos desde HTML", len(fresh))
+
+    for url, its in by_url.items():
+        row = cached.get(url)
+        if row:
+            extra = to_item_fields(row)
+            for it in its:
+                for name, value in extra.items():
+                    setattr(it, name, value)
+
+    return items
@@ -1,19 +1,102 @@
+import asyncio
+import logging
+
 import httpx
 
+from .config import settings
+
 BASE = "https://api.euskadi.eus/procurements"
 
-async def fetch_json(url: str):
-    async with httpx.AsyncClient(timeout=60) as client:
-        r = await client.get(url, headers={"Accept": "application/json"})
-        r.raise_for_status()
-        return r.json()
+log = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class EuskadiClient:
+    """
+    Cliente compartido para api.euskadi.eus: un único pool de conexiones
+    (HTTP/2 keep-alive), reintentos con backoff y paginación concurrente.
+    """
+
+    def __init__(self, concurrency=4, retries=3, backoff=0.5, timeout=60):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=self.timeout,
+                headers={"Accept": "application/json"},
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_json(self, url: str):
+        for attempt in range(self.retries + 1):
+            try:
+                r = await self._get_client().get(url)
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise
+                err = repr(e)
+            else:
+                if r.status_code not in RETRY_STATUS or attempt == self.retries:
+                    r.raise_for_status()
+                    return r.json()
+                err = f"HTTP {r.status_code}"
+
+            delay = self.backoff * (2 ** attempt)
+            log.warning("⚠️ %s (%s), reintento en %.1fs", url, err, delay)
+            await asyncio.sleep(delay)
+
+    async def iter_pages(self, page_url):
+        """
+        Descarga la página 1 para conocer totalPages y reparte el resto
+        con concurrencia limitada. Devuelve cada página según llega
+        (no en orden).
+        """
+        first = await self.fetch_json(page_url(1))
+        yield first
+
+        total = first.get("totalPages", 0) or 0
+        if total <= 1:
+            return
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(page):
+            async with sem:
+                return await self.fetch_json(page_url(page))
+
+        tasks = [asyncio.ensure_future(fetch(p)) for p in range(2, total + 1)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
+
+
+client = EuskadiClient(concurrency=settings.EUSKADI_CONCURRENCY)
 
-def notices_url(contract_type_id, page):
+def notices_url(contract_type_id, page, date_from=None, date_to=None):
     return (
         f"{BASE}/contracting-notices?"
         f"contract-type-id={contract_type_id}"
-        f"&publication-date.gt=2025-01-01"
-        f"&publication-date.lt=2025-12-31"
+        f"&publication-date.gt={date_from or settings.YEAR_FROM}"
+        f"&publication-date.lt={date_to or settings.YEAR_TO}"
         f"&orderBy=lastPublicationDate"
         f"&orderType=DESC"
         f"&currentPage={page}"
@@ -25,8 +108,8 @@ def contracts_url(contract_type_id, page):
     return (
         f"{BASE}/contracts?"
         f"contract-type-id={contract_type_id}"
-        f"&award-date.gt=2025-01-01"
-        f"&award-date.lt=2025-12-31"
+        f"&award-date.gt={settings.YEAR_FROM}"
+        f"&award-date.lt={settings.YEAR_TO}"
         f"&orderBy=awardDate"
         f"&orderType=DESC"
         f"&currentPage={page}"
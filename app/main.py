@@ -3,12 +3,21 @@ import logging
 import os
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.types import Update
 
-from .bot_handlers import router, setup_scheduler
+from .bot_handlers import router
+from .config import settings
+from .database import engine, init_db, SessionLocal
+from .euskadi_client import client as euskadi_client
 from .middlewares import DBSessionMiddleware
+from .rss_client import close_client
+from .scheduler import setup_scheduler, shutdown_scheduler
+from .update_queue import UpdateQueue
+from .search import ensure_search_index
+from .updater import ensure_classification
 
 
 import asyncio
@@ -51,7 +60,8 @@ async def root():
     return {
         "status": "ok",
         "service": "bot-gipuzkoa",
-        "bot": "running"
+        "bot": "running",
+        "db": db_middleware.stats(),
     }
 
 
@@ -75,7 +85,8 @@ dp = Dispatcher()
 dp.include_router(router)
 
 # middleware DB (SIN parámetros)
-dp.update.middleware(DBSessionMiddleware())
+db_middleware = DBSessionMiddleware()
+dp.update.middleware(db_middleware)
 
 
 # =========================
@@ -85,10 +96,21 @@ WEBHOOK_PATH = "/webhook"
 WEBHOOK_URL = f"https://bot-gipuzkoa.onrender.com{WEBHOOK_PATH}"
 
 
+# los updates se procesan fuera de la respuesta HTTP
+update_queue = UpdateQueue(
+    dp,
+    bot,
+    workers=int(os.getenv("UPDATE_WORKERS", "4")),
+    max_size=int(os.getenv("UPDATE_QUEUE_SIZE", "1000")),
+)
+
+
 @app.post(WEBHOOK_PATH)
 async def telegram_webhook(update: dict):
     telegram_update = Update.model_validate(update)
-    await dp.feed_update(bot, telegram_update)
+    if not update_queue.submit(telegram_update):
+        # cola llena: Telegram reintentará más tarde
+        return JSONResponse({"ok": False}, status_code=503)
     return {"ok": True}
     
 @app.head("/")
@@ -100,16 +122,32 @@ async def root_head():
 # =========================
 @app.on_event("startup")
 async def on_startup():
+    await init_db()
+
+    async with SessionLocal() as db:
+        await ensure_classification(db)
+        await ensure_search_index(db)
+
+    update_queue.start()
     await bot.set_webhook(WEBHOOK_URL)
 
     setup_scheduler(bot)
 
     logging.info("🚀 Bot iniciado con webhook")
-    logging.info("⏰ Avisos automáticos activos (11:00 y 17:00)")
+    logging.info(
+        "⏰ Actualizaciones automáticas activas (%s h, feeds cada %s min)",
+        settings.UPDATE_HOURS,
+        settings.FEED_REFRESH_MINUTES,
+    )
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    shutdown_scheduler()
+    await update_queue.stop()
+    await close_client()
+    await euskadi_client.aclose()
+    await engine.dispose()
     await bot.session.close()
     logging.info("🛑 Bot detenido")
 
@@ -1,20 +1,67 @@
 from typing import Callable, Awaitable, Dict, Any
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import SessionLocal
 
 
+class LazySession:
+    """
+    Proxy de AsyncSession: la sesión (y con ella la conexión del pool)
+    solo se abre la primera vez que un handler usa `db`.
+    """
+
+    __slots__ = ("_factory", "_session", "_on_open")
+
+    def __init__(self, factory, on_open=None):
+        self._factory = factory
+        self._session = None
+        self._on_open = on_open
+
+    @property
+    def opened(self):
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            if self._on_open is not None:
+                self._on_open()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
 class DBSessionMiddleware(BaseMiddleware):
+    def __init__(self):
+        self.updates_handled = 0
+        self.sessions_opened = 0
+
+    def _count_session(self):
+        self.sessions_opened += 1
+
+    def stats(self):
+        return {
+            "updates_handled": self.updates_handled,
+            "sessions_opened": self.sessions_opened,
+        }
+
     async def __call__(
         self,
         handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
         event: Any,
         data: Dict[str, Any],
     ) -> Any:
-        db: Session = SessionLocal()
+        self.updates_handled += 1
+        db = LazySession(SessionLocal, on_open=self._count_session)
         try:
             data["db"] = db
             return await handler(event, data)
         finally:
-            db.close()
+            await db.close()
@@ -0,0 +1,137 @@
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import inspect, text
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+# =========================
+# 1: fechas String -> Date / DateTime
+# =========================
+DATE_COLUMNS = {
+    "notices": {
+        "first_publication_date": "timestamp",
+        "last_publication_date": "timestamp",
+        "deadline_date": "date",
+    },
+    "contracts": {
+        "award_date": "date",
+        "contract_end_date": "date",
+    },
+}
+
+
+def _typed_dates_postgresql(conn, insp):
+    for table, cols in DATE_COLUMNS.items():
+        current = {c["name"]: c["type"] for c in insp.get_columns(table)}
+        for col, kind in cols.items():
+            if col not in current:
+                continue
+            if current[col].python_type is not str:
+                continue  # ya convertida
+
+            if kind == "date":
+                using = f"NULLIF(substr({col}, 1, 10), '')::date"
+            else:
+                using = f"(NULLIF({col}, '')::timestamptz AT TIME ZONE 'UTC')"
+
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {col} "
+                f"TYPE {kind} USING {using}"
+            ))
+
+
+def _sqlite_value(raw, kind):
+    # como updater.parse_date / parse_datetime (no se importan: ciclo
+    # con database); lo que no se entiende queda a NULL
+    try:
+        if kind == "date":
+            return str(date.fromisoformat(raw[:10]))
+        d = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if d.tzinfo is not None:
+        d = d.astimezone(timezone.utc).replace(tzinfo=None)
+    return str(d)
+
+
+def _typed_dates_sqlite(conn, insp):
+    # SQLite no tiene tipos rígidos: basta con reescribir los valores en
+    # el formato que SQLAlchemy espera para Date / DateTime. Se pasa por
+    # Python para llevar el offset a UTC, igual que el USING de PostgreSQL.
+    for table, cols in DATE_COLUMNS.items():
+        for col, kind in cols.items():
+            rows = conn.execute(text(
+                f"SELECT rowid, {col} FROM {table} WHERE {col} IS NOT NULL"
+            )).all()
+            values = [
+                {"id": rowid, "v": _sqlite_value(raw, kind) if raw else None}
+                for rowid, raw in rows
+            ]
+            if values:
+                conn.execute(
+                    text(f"UPDATE {table} SET {col} = :v WHERE rowid = :id"),
+                    values,
+                )
+
+
+def typed_dates(conn):
+    insp = inspect(conn)
+    if conn.dialect.name == "postgresql":
+        _typed_dates_postgresql(conn, insp)
+    elif conn.dialect.name == "sqlite":
+        _typed_dates_sqlite(conn, insp)
+
+
+# =========================
+# 2: índice de vistas con territorio
+# =========================
+def view_index_scope(conn):
+    # ix_notices_view_scope lo crea create_missing_indexes(); el índice
+    # antiguo sin territorio sobra
+    conn.execute(text("DROP INDEX IF EXISTS ix_notices_view"))
+
+
+MIGRATIONS = [
+    typed_dates,
+    view_index_scope,
+]
+
+
+# =========================
+# RUNNER
+# =========================
+def get_schema_version(conn):
+    row = conn.execute(
+        text("SELECT value FROM meta WHERE key = :k"),
+        {"k": SCHEMA_VERSION_KEY},
+    ).first()
+    return int(row[0]) if row else 0
+
+
+def set_schema_version(conn, version):
+    updated = conn.execute(
+        text("UPDATE meta SET value = :v WHERE key = :k"),
+        {"k": SCHEMA_VERSION_KEY, "v": str(version)},
+    ).rowcount
+    if not updated:
+        conn.execute(
+            text("INSERT INTO meta (key, value) VALUES (:k, :v)"),
+            {"k": SCHEMA_VERSION_KEY, "v": str(version)},
+        )
+
+
+def run_migrations(conn):
+    """
+    Aplica en orden las migraciones pendientes y guarda la versión en la
+    tabla meta. Corre dentro de la transacción de init_db().
+    """
+    version = get_schema_version(conn)
+
+    for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        log.info("🛠 Migración %s: %s", i, migration.__name__)
+        migration(conn)
+        set_schema_version(conn, i)
@@ -1,12 +1,16 @@
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Boolean,
+    Date,
     DateTime,
     ForeignKey,
     Text,
     Numeric,
+    Float,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -34,8 +38,8 @@ class Notice(Base):
     code = Column(String)
     object = Column(Text)
 
-    first_publication_date = Column(String)
-    last_publication_date = Column(String)
+    first_publication_date = Column(DateTime)
+    last_publication_date = Column(DateTime)
 
     contracting_authority_name = Column(String)
     contracting_authority_scope = Column(String)
@@ -43,14 +47,28 @@ class Notice(Base):
     contract_type_id = Column(Integer)
     procedure_status_id = Column(Integer)
 
-    deadline_date = Column(String)
+    deadline_date = Column(Date)
     budget_without_vat = Column(Numeric)
 
+    # clasificación ING calculada al ingerir (classifier.classify_batch)
+    is_ingenieria = Column(Boolean, index=True)
+
     main_entity_of_page = Column(String)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
     contracts = relationship("Contract", back_populates="notice")
 
+    # vistas del bot: (tipo, estado, territorio) + filtro de plazo
+    __table_args__ = (
+        Index(
+            "ix_notices_view_scope",
+            "contract_type_id",
+            "procedure_status_id",
+            "contracting_authority_scope",
+            "deadline_date",
+        ),
+    )
+
 
 # =========================
 # CONTRACT
@@ -63,14 +81,16 @@ class Contract(Base):
         Integer,
         ForeignKey("notices.id")
     )
+    # id del anuncio según la API (puede no existir aún en notices)
+    contracting_notice_ref = Column(Integer, index=True)
 
     object = Column(Text)
     contract_type_id = Column(Integer)
     procedure_status_id = Column(Integer)
     procedure_type_id = Column(Integer)
 
-    award_date = Column(String)
-    contract_end_date = Column(String)
+    award_date = Column(Date)
+    contract_end_date = Column(Date)
 
     award_amount = Column(Numeric)
     award_amount_without_vat = Column(Numeric)
@@ -82,3 +102,87 @@ class Contract(Base):
     main_entity_of_page = Column(String)
 
     notice = relationship("Notice", back_populates="contracts")
+
+
+# =========================
+# ENRIQUECIMIENTO HTML (caché persistente de scrape_notice)
+# =========================
+class NoticeEnrichment(Base):
+    __tablename__ = "notice_enrichment"
+
+    url = Column(String, primary_key=True)
+    content_hash = Column(String, index=True)
+
+    deadline_date = Column(Date)
+    budget_without_vat = Column(Numeric)
+    entity_name = Column(String)
+
+    scraped_at = Column(DateTime, default=datetime.utcnow)
+
+
+# =========================
+# ALERTAS (anuncios ya avisados)
+# =========================
+class AlertSeen(Base):
+    __tablename__ = "alert_seen"
+
+    notice_key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    seen_at = Column(DateTime, default=datetime.utcnow)
+
+
+# entrega de cada aviso a cada destino (grupo de alertas o chat
+# suscrito): un destino que falla no bloquea a los demás y se reintenta
+# hasta MAX_DELIVERY_ATTEMPTS veces
+class AlertDelivery(Base):
+    __tablename__ = "alert_deliveries"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    notice_key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+
+    contract_type = Column(String, nullable=False)   # vista: OBR | SERV
+    is_new = Column(Boolean, default=True)
+
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)   # None = pendiente
+
+    __table_args__ = (
+        Index("ix_alert_deliveries_pending", "contract_type", "sent_at"),
+    )
+
+
+# =========================
+# SUSCRIPCIONES POR CHAT
+# =========================
+class Subscription(Base):
+    __tablename__ = "subscriptions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id = Column(BigInteger, nullable=False, index=True)
+
+    # criterios (None = cualquiera); textos ya normalizados
+    contract_type = Column(String)   # OBR | SERV | ING
+    keyword = Column(String)
+    min_budget = Column(Numeric)
+    authority = Column(String)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# =========================
+# ÍNDICE DE BÚSQUEDA (/buscar)
+# =========================
+# término normalizado -> anuncios; en PostgreSQL con collation "C" para
+# que los rangos de prefijo (term >= 'PROYECT' AND term < 'PROYECU')
+# usen el índice de la PK
+TERM_TYPE = String().with_variant(String(collation="C"), "postgresql")
+
+
+class NoticeTerm(Base):
+    __tablename__ = "notice_terms"
+
+    term = Column(TERM_TYPE, primary_key=True)
+    notice_id = Column(Integer, primary_key=True, index=True)
+    weight = Column(Float, nullable=False)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from .ratelimit import GLOBAL_RATE, TokenBucket, chat_bucket
+
+log = logging.getLogger(__name__)
+
+# =========================
+# ENVÍOS A TELEGRAM CON RATE LIMIT
+# =========================
+# Todo lo que sale hacia Telegram (mensajes nuevos y ediciones) pasa
+# por aquí con reintento con retry_after. Los mensajes nuevos esperan
+# al bucket global y al del chat; las ediciones solo al global: el
+# límite de 20/min por grupo es de mensajes, y paginar un grupo con él
+# volvería a costar segundos por click. Las ediciones seguidas del mismo
+# mensaje ya se funden en una y el retry_after cubre el resto.
+_global_bucket = TokenBucket(GLOBAL_RATE, capacity=GLOBAL_RATE)
+_chat_buckets = OrderedDict()
+CHAT_BUCKETS_MAX = 10_000
+
+MAX_ATTEMPTS = 3
+
+
+def _bucket_for(chat_id):
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = _chat_buckets[chat_id] = chat_bucket(chat_id)
+        if len(_chat_buckets) > CHAT_BUCKETS_MAX:
+            _chat_buckets.popitem(last=False)
+    else:
+        _chat_buckets.move_to_end(chat_id)
+    return bucket
+
+
+async def _acquire(chat_id):
+    await _bucket_for(chat_id).acquire()
+    await _global_bucket.acquire()
+
+
+async def _throttled(chat_id, call):
+    """
+    Espera turno en el bucket del chat y en el global y ejecuta `call`;
+    si Telegram devuelve retry_after, espera y reintenta.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        await _acquire(chat_id)
+        try:
+            return await call()
+        except TelegramRetryAfter as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            log.warning("⏳ Flood control en %s: esperando %ss", chat_id, e.retry_after)
+            await asyncio.sleep(e.retry_after)
+
+
+async def send_message(bot, chat_id, text, **kwargs):
+    return await _throttled(
+        chat_id,
+        lambda: bot.send_message(chat_id, text, **kwargs),
+    )
+
+
+async def answer(message, text, **kwargs):
+    """message.answer() con rate limit."""
+    return await _throttled(
+        message.chat.id,
+        lambda: message.answer(text, **kwargs),
+    )
+
+
+async def fan_out(bot, messages, **kwargs):
+    """
+    Envía [(chat_id, texto)] en paralelo entre chats y en orden dentro
+    de cada chat; cada chat respeta su propio límite. Devuelve
+    (resultados, bloqueados): por mensaje y en el mismo orden, True
+    (enviado), False (falló) o None (no se intentó), y el conjunto de
+    chats donde el bot está bloqueado o expulsado, con los que no se
+    insiste.
+    """
+    by_chat = {}
+    for n, (chat_id, text) in enumerate(messages):
+        by_chat.setdefault(chat_id, []).append((n, text))
+
+    sent = [None] * len(messages)
+    blocked = set()
+
+    async def send_chat(chat_id, texts):
+        for n, text in texts:
+            try:
+                await send_message(bot, chat_id, text, **kwargs)
+            except TelegramForbiddenError:
+                log.warning("⚠️ Bot bloqueado o expulsado en %s", chat_id)
+                sent[n] = False
+                blocked.add(chat_id)
+                return
+            except Exception:
+                # un mensaje malo no frena al resto del chat
+                log.exception("⚠️ No se pudo enviar a %s", chat_id)
+                sent[n] = False
+            else:
+                sent[n] = True
+
+    await asyncio.gather(*(send_chat(c, t) for c, t in by_chat.items()))
+    return sent, blocked
+
+
+# =========================
+# EDICIONES COALESCIDAS
+# =========================
+class _PendingEdit:
+    __slots__ = ("payload", "waiter")
+
+    def __init__(self):
+        self.payload = None   # (message, text, kwargs) más reciente
+        self.waiter = None    # future del llamante de ese payload
+
+
+# (chat_id, message_id) -> _PendingEdit con un worker en marcha
+_edits = {}
+_workers = set()
+
+
+def _resolve(waiter, result=None, exc=None):
+    # el llamante puede haberse cancelado mientras esperaba
+    if waiter is None or waiter.done():
+        return
+    if exc is not None:
+        waiter.set_exception(exc)
+    else:
+        waiter.set_result(result)
+
+
+def _supersede(entry):
+    _resolve(entry.waiter)
+
+
+async def _edit_worker(key, entry):
+    chat_id = key[0]
+    attempts = 0
+    try:
+        while entry.payload is not None:
+            await _global_bucket.acquire()
+
+            # se coge el payload al tener turno: lo que llegó mientras
+            # se esperaba ya ha sustituido al anterior
+            (message, text, kwargs), waiter = entry.payload, entry.waiter
+            entry.payload = entry.waiter = None
+
+            try:
+                result = await message.edit_text(text, **kwargs)
+            except TelegramRetryAfter as e:
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    _resolve(waiter, exc=e)
+                    attempts = 0
+                    continue
+                if entry.payload is None:
+                    entry.payload, entry.waiter = (message, text, kwargs), waiter
+                else:
+                    _resolve(waiter)
+                log.warning("⏳ Flood control en %s: esperando %ss", chat_id, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                attempts = 0
+                _resolve(waiter, exc=e)
+            else:
+                attempts = 0
+                _resolve(waiter, result)
+    finally:
+        _edits.pop(key, None)
+        _supersede(entry)
+
+
+def _submit_edit(message, text, kwargs):
+    key = (message.chat.id, message.message_id)
+    waiter = asyncio.get_running_loop().create_future()
+
+    entry = _edits.get(key)
+    if entry is None:
+        entry = _edits[key] = _PendingEdit()
+        entry.payload, entry.waiter = (message, text, kwargs), waiter
+        task = asyncio.create_task(_edit_worker(key, entry))
+        _workers.add(task)
+        task.add_done_callback(_workers.discard)
+    else:
+        _supersede(entry)
+        entry.payload, entry.waiter = (message, text, kwargs), waiter
+
+    return waiter
+
+
+async def edit_text(message, text, **kwargs):
+    """
+    message.edit_text() con rate limit. Si el mismo mensaje recibe
+    varias ediciones seguidas, sólo se envía la última: las anteriores
+    que no llegaron a salir devuelven None.
+    """
+    return await _submit_edit(message, text, kwargs)
+
+
+def _log_edit_error(fut):
+    if fut.cancelled() or fut.exception() is None:
+        return
+    e = fut.exception()
+    if "message is not modified" not in str(e):
+        log.warning("⚠️ Edición fallida: %r", e)
+
+
+def schedule_edit(message, text, **kwargs):
+    """
+    Como edit_text() pero sin esperar al envío: el handler termina ya y
+    el siguiente update del chat puede sustituir a esta edición si aún
+    no ha salido. Los errores se registran en el log.
+    """
+    waiter = _submit_edit(message, text, kwargs)
+    waiter.add_done_callback(_log_edit_error)
+    return waiter
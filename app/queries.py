@@ -0,0 +1,141 @@
+from datetime import datetime
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .models import Meta, Notice
+from .records import NoticeItem
+
+# ids de la API (los mismos que usan los feeds RSS: p01 / p02)
+CONTRACT_TYPE_IDS = {
+    "OBR": 1,
+    "SERV": 2,
+    "ING": 2,
+}
+
+PROCEDURE_STATUS_IDS = {
+    "ABI": 3,
+    "PLZ": 3,
+    "CER": 4,
+}
+
+VIEW_COLUMNS = (
+    Notice.id,
+    Notice.object,
+    Notice.contracting_authority_name,
+    Notice.first_publication_date,
+    Notice.deadline_date,
+    Notice.budget_without_vat,
+    Notice.main_entity_of_page,
+    Notice.is_ingenieria,
+)
+
+
+# versión de los datos locales: la sube el updater tras cada escritura
+# y sirve para invalidar las páginas ya renderizadas
+_data_version = 0
+
+# tipos de contrato que ya tienen anuncios en BD (una vez sincronizados
+# no vuelven a quedarse vacíos)
+_READY = set()
+
+# meta: territorio con el que terminó la última sincronización completa
+SCOPE_META_KEY = "notices_scope"
+
+
+def data_version():
+    return _data_version
+
+
+def bump_data_version():
+    global _data_version
+    _data_version += 1
+
+
+def window_covers_today():
+    # el RSS no tiene ventana de fechas: la BD solo lo sustituye si la
+    # ventana de sincronización llega hasta hoy
+    return settings.YEAR_TO >= datetime.utcnow().date().isoformat()
+
+
+async def has_notices(db: AsyncSession, contrato):
+    """
+    True si la BD cubre los mismos datos que el feed RSS de la vista:
+    sincronización completa del mismo territorio, ventana hasta hoy y
+    anuncios de ese tipo.
+    """
+    if not window_covers_today():
+        return False
+
+    type_id = CONTRACT_TYPE_IDS[contrato]
+    if type_id in _READY:
+        return True
+
+    scope = await db.get(Meta, SCOPE_META_KEY)
+    if scope is None or scope.value != settings.NUTS:
+        return False
+
+    q = (
+        select(Notice.id)
+        .where(Notice.contract_type_id == type_id)
+        .where(Notice.contracting_authority_scope == settings.NUTS)
+        .limit(1)
+    )
+    if (await db.execute(q)).first() is None:
+        return False
+
+    _READY.add(type_id)
+    return True
+
+
+def view_query(contrato, estado):
+    """
+    Una vista del bot (OBR/SERV/ING × ABI/PLZ/CER) como consulta
+    sobre ix_notices_view_scope.
+    """
+    q = select(*VIEW_COLUMNS).where(
+        Notice.contract_type_id == CONTRACT_TYPE_IDS[contrato],
+        Notice.procedure_status_id == PROCEDURE_STATUS_IDS[estado],
+        # mismo territorio que los feeds RSS
+        Notice.contracting_authority_scope == settings.NUTS,
+    )
+
+    if contrato == "ING":
+        q = q.where(Notice.is_ingenieria.is_(True))
+
+    if estado == "PLZ":
+        today = datetime.utcnow().date()
+        # ⚠️ si no hay deadline, NO se descarta (igual que filter_en_plazo)
+        q = q.where(or_(
+            Notice.deadline_date.is_(None),
+            Notice.deadline_date >= today,
+        ))
+
+    return q
+
+
+def row_to_item(row):
+    return NoticeItem(
+        id=row.id,
+        object=(row.object or "").strip(),
+        entity=row.contracting_authority_name,
+        first_publication_date=(
+            row.first_publication_date.date()
+            if row.first_publication_date
+            else None
+        ),
+        deadline_date=row.deadline_date,
+        budget=(
+            float(row.budget_without_vat)
+            if row.budget_without_vat is not None
+            else None
+        ),
+        url=row.main_entity_of_page,
+        is_ingenieria=bool(row.is_ingenieria),
+    )
+
+
+async def load_view_items(db: AsyncSession, contrato, estado):
+    result = await db.execute(view_query(contrato, estado))
+    return [row_to_item(r) for r in result]
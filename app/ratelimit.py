@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket asíncrono: `rate` tokens por segundo, hasta `capacity`
+    acumulados. acquire() espera lo justo hasta que hay token.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# límites de Telegram: ~30 mensajes/s en total, 1/s por chat privado y
+# 20/min por grupo
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+
+
+def chat_bucket(chat_id):
+    if chat_id < 0:
+        return TokenBucket(GROUP_CHAT_RATE, capacity=3)
+    return TokenBucket(PRIVATE_CHAT_RATE, capacity=1)
@@ -0,0 +1,36 @@
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+DEFAULT_ENTITY = "OTROS"
+
+
+def intern_name(name):
+    """Nombres de entidad internados: miles de items comparten unos pocos."""
+    if not name:
+        return DEFAULT_ENTITY
+    return sys.intern(name)
+
+
+# =========================
+# ANUNCIO (REGISTRO COMPACTO)
+# =========================
+@dataclass(slots=True)
+class NoticeItem:
+    """
+    Un anuncio tal y como lo usan vistas, alertas y suscripciones, venga
+    del RSS o de la BD. Fechas e importe llegan ya parseados.
+    """
+
+    id: object
+    object: str
+    entity: str = DEFAULT_ENTITY
+    first_publication_date: Optional[date] = None
+    deadline_date: Optional[date] = None
+    budget: Optional[float] = None
+    url: Optional[str] = None
+    is_ingenieria: bool = False
+
+    def __post_init__(self):
+        self.entity = intern_name(self.entity)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+import feedparser
+import httpx
+
+log = logging.getLogger(__name__)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; OCGIPBOT/1.0)"
+}
+
+# cliente compartido: keep-alive con contratacion.euskadi.eus
+_client = None
+
+# GET condicional: url -> (etag, last_modified, entries)
+VALIDATORS = {}
+
+
+def get_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(30, connect=10),
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=10,
+                max_keepalive_connections=5,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_entries(url: str):
+    """
+    Descarga el feed sin bloquear el event loop. Devuelve
+    (entradas, modificado): si el servidor responde 304 se reutilizan las
+    entradas anteriores con modificado=False.
+    """
+    headers = {}
+    cached = VALIDATORS.get(url)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    r = await get_client().get(url, headers=headers)
+
+    if r.status_code == 304 and cached:
+        log.info("📡 RSS %s -> 304 (sin cambios)", url)
+        return cached[2], False
+
+    r.raise_for_status()
+
+    # el parseo XML es CPU: fuera del loop
+    feed = await asyncio.to_thread(feedparser.parse, r.content)
+    entries = feed.entries
+
+    etag = r.headers.get("ETag")
+    last_modified = r.headers.get("Last-Modified")
+    if etag or last_modified:
+        VALIDATORS[url] = (etag, last_modified, entries)
+    else:
+        VALIDATORS.pop(url, None)
+
+    log.info("📡 RSS %s -> %s entradas", url, len(entries))
+    return entries, True
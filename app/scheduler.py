@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from .alerts import run_alerts
+from .bot_handlers import RSS_URLS, get_snapshot
+from .config import settings
+from .database import SessionLocal
+from .updater import refresh_all
+
+log = logging.getLogger(__name__)
+
+scheduler = None
+
+
+# =========================
+# JOBS
+# =========================
+async def prewarm_feeds():
+    """
+    Refresca los 4 feeds RSS en segundo plano para que los callbacks
+    siempre lean un snapshot ya descargado.
+    """
+    results = await asyncio.gather(
+        *(get_snapshot(c, e, force=True) for c, e in RSS_URLS),
+        return_exceptions=True,
+    )
+    for key, res in zip(RSS_URLS, results):
+        if isinstance(res, Exception):
+            log.warning("⚠️ Prewarm %s falló: %r", key, res)
+
+
+async def alerts_job(bot):
+    try:
+        await run_alerts(bot)
+    except Exception:
+        log.exception("⚠️ Alertas fallaron")
+
+
+async def sync_api():
+    async with SessionLocal() as db:
+        try:
+            await refresh_all(db)
+            log.info("✅ Sincronización API completada")
+        except Exception:
+            await db.rollback()
+            log.exception("⚠️ Sincronización API falló")
+
+
+# =========================
+# SETUP
+# =========================
+def setup_scheduler(bot):
+    global scheduler
+
+    if scheduler is not None:
+        return scheduler
+
+    scheduler = AsyncIOScheduler(timezone=settings.TZ)
+
+    scheduler.add_job(
+        prewarm_feeds,
+        IntervalTrigger(
+            minutes=settings.FEED_REFRESH_MINUTES,
+            jitter=settings.SCHEDULER_JITTER,
+        ),
+        id="prewarm_feeds",
+        max_instances=1,
+        coalesce=True,
+        # primer calentamiento inmediato, sin esperar al primer intervalo
+        next_run_time=datetime.now(scheduler.timezone),
+    )
+
+    scheduler.add_job(
+        sync_api,
+        CronTrigger(
+            hour=settings.UPDATE_HOURS,
+            minute=0,
+            timezone=settings.TZ,
+            jitter=settings.SCHEDULER_JITTER,
+        ),
+        id="sync_api",
+        max_instances=1,
+        coalesce=True,
+    )
+
+    scheduler.add_job(
+        alerts_job,
+        IntervalTrigger(
+            minutes=settings.ALERT_MINUTES,
+            jitter=settings.SCHEDULER_JITTER,
+        ),
+        args=[bot],
+        id="alerts",
+        max_instances=1,
+        coalesce=True,
+    )
+
+    scheduler.start()
+
+    return scheduler
+
+
+def shutdown_scheduler():
+    global scheduler
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+        scheduler = None
@@ -0,0 +1,268 @@
+import hashlib
+import math
+from collections import Counter
+
+from sqlalchemy import and_, case, delete, func, insert, or_, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .classifier import normalize_text
+from .models import Meta, Notice, NoticeTerm
+from .queries import VIEW_COLUMNS, row_to_item
+from .token_store import TokenStore
+
+# =========================
+# TOKENIZADO
+# =========================
+STOPWORDS = frozenset("""
+    A AL CON DE DEL E EL EN LA LAS LO LOS O PARA POR QUE SE SU SUS U UN UNA
+    UNAS UNOS Y
+""".split())
+
+MIN_TERM_LEN = 2
+
+# peso de cada aparición según el campo
+OBJECT_WEIGHT = 1.0
+AUTHORITY_WEIGHT = 0.5
+
+# cambia si cambian las reglas de tokenizado: obliga a reindexar
+INDEX_VERSION = hashlib.sha1(
+    "|".join(
+        sorted(STOPWORDS)
+        + [str(MIN_TERM_LEN), str(OBJECT_WEIGHT), str(AUTHORITY_WEIGHT)]
+    ).encode()
+).hexdigest()[:12]
+
+INDEX_VERSION_KEY = "search_index_version"
+
+
+def tokenize(text):
+    return [
+        t
+        for t in normalize_text(text).split()
+        if len(t) >= MIN_TERM_LEN and t not in STOPWORDS
+    ]
+
+
+def notice_terms(obj, authority):
+    """{término: peso} de un anuncio (objeto + poder adjudicador)."""
+    weights = Counter()
+    for t in tokenize(obj):
+        weights[t] += OBJECT_WEIGHT
+    for t in tokenize(authority):
+        weights[t] += AUTHORITY_WEIGHT
+    return weights
+
+
+def term_rows(notices):
+    """Filas de notice_terms para [(id, objeto, poder adjudicador)]."""
+    return [
+        {"term": term, "notice_id": notice_id, "weight": weight}
+        for notice_id, obj, authority in notices
+        for term, weight in notice_terms(obj, authority).items()
+    ]
+
+
+# =========================
+# MANTENIMIENTO DEL ÍNDICE
+# =========================
+INDEX_CHUNK = 1000
+
+
+async def index_notices(db: AsyncSession, rows):
+    """
+    Reindexa los anuncios de una página recién escrita (filas de
+    notice_rows): se borran sus términos y se insertan los nuevos.
+    """
+    notices = {
+        r["id"]: (r["id"], r.get("object"), r.get("contracting_authority_name"))
+        for r in rows
+    }
+    if not notices:
+        return 0
+
+    conn = await db.connection()
+    await conn.execute(
+        delete(NoticeTerm.__table__)
+        .where(NoticeTerm.notice_id.in_(list(notices)))
+    )
+    terms = term_rows(notices.values())
+    if terms:
+        await conn.execute(insert(NoticeTerm.__table__), terms)
+    return len(terms)
+
+
+async def reindex_all(db: AsyncSession):
+    """Reconstruye notice_terms entero a partir de notices (backfill)."""
+    conn = await db.connection()
+    await conn.execute(delete(NoticeTerm.__table__))
+
+    total = 0
+    last_id = None
+    while True:
+        q = (
+            select(Notice.id, Notice.object, Notice.contracting_authority_name)
+            .order_by(Notice.id)
+            .limit(INDEX_CHUNK)
+        )
+        if last_id is not None:
+            q = q.where(Notice.id > last_id)
+        rows = (await db.execute(q)).all()
+        if not rows:
+            break
+
+        terms = term_rows(rows)
+        if terms:
+            await conn.execute(insert(NoticeTerm.__table__), terms)
+        total += len(rows)
+        last_id = rows[-1].id
+
+    row = await db.get(Meta, INDEX_VERSION_KEY)
+    if row is None:
+        db.add(Meta(key=INDEX_VERSION_KEY, value=INDEX_VERSION))
+    else:
+        row.value = INDEX_VERSION
+    await db.commit()
+    return total
+
+
+async def ensure_search_index(db: AsyncSession):
+    """Reindexa solo si no hay índice o han cambiado las reglas."""
+    row = await db.get(Meta, INDEX_VERSION_KEY)
+    if row is not None and row.value == INDEX_VERSION:
+        return 0
+    return await reindex_all(db)
+
+
+# =========================
+# CONSULTA (tf-idf)
+# =========================
+MAX_EXPANSIONS = 20   # términos por prefijo con idf propio
+MAX_RESULTS = 200     # resultados materializados por búsqueda
+
+
+def _prefix_upper(prefix):
+    # cota superior del rango de prefijo (orden binario / collation "C")
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_range(prefix):
+    return and_(NoticeTerm.term >= prefix, NoticeTerm.term < _prefix_upper(prefix))
+
+
+async def _expand(db: AsyncSession, prefix):
+    """Los términos más frecuentes que empiezan por `prefix`, con su df."""
+    q = (
+        select(NoticeTerm.term, func.count().label("df"))
+        .where(_prefix_range(prefix))
+        .group_by(NoticeTerm.term)
+        .order_by(func.count().desc())
+        .limit(MAX_EXPANSIONS)
+    )
+    return (await db.execute(q)).all()
+
+
+async def search(db: AsyncSession, query, limit=MAX_RESULTS):
+    """
+    Devuelve (total, [notice_id]) ordenados por relevancia. Todas las
+    palabras de la consulta deben aparecer (como prefijo: «proyect»
+    encuentra «PROYECTO»); cada término puntúa peso × idf.
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    # «proyect proyecto»: la palabra que es prefijo de otra no añade nada
+    words = [
+        w for w in words
+        if not any(o != w and o.startswith(w) for o in words)
+    ]
+    if not words:
+        return 0, []
+
+    n_docs = await db.scalar(select(func.count()).select_from(Notice)) or 0
+
+    # el filtro es el rango de prefijo entero; las expansiones (las más
+    # frecuentes) solo dan el idf. Un término fuera de ellas es más raro
+    # que la última, así que se puntúa con el idf de esa como mínimo.
+    idf = {}
+    default_idf = []
+    rarest = None
+    for word in words:
+        expanded = await _expand(db, word)
+        if not expanded:
+            return 0, []
+        for term, df in expanded:
+            idf[term] = max(idf.get(term, 0.0), math.log(1 + n_docs / df))
+        default_idf.append(math.log(1 + n_docs / expanded[-1].df))
+
+        df_word = sum(df for _, df in expanded)
+        if rarest is None or df_word < rarest[0]:
+            rarest = (df_word, word)
+
+    ranges = [_prefix_range(w) for w in words]
+    term_idf = case(
+        idf,
+        value=NoticeTerm.term,
+        else_=case(*zip(ranges, default_idf)),
+    )
+    score = func.sum(NoticeTerm.weight * term_idf)
+    # ninguna palabra es prefijo de otra: los rangos no se solapan
+    matched = func.count(func.distinct(case(*((r, i) for i, r in enumerate(ranges)))))
+
+    # solo se agregan los anuncios que tienen la palabra más rara
+    candidates = true()
+    if len(words) > 1:
+        candidates = NoticeTerm.notice_id.in_(
+            select(NoticeTerm.notice_id).where(_prefix_range(rarest[1]))
+        )
+
+    # una sola agregación: el total sale de la ventana count() over ()
+    ranked = (await db.execute(
+        select(
+            NoticeTerm.notice_id,
+            func.count().over().label("total"),
+        )
+        .where(or_(*ranges))
+        .where(candidates)
+        .group_by(NoticeTerm.notice_id)
+        .having(matched == len(words))
+        .order_by(score.desc(), NoticeTerm.notice_id.desc())
+        .limit(limit)
+    )).all()
+
+    if not ranked:
+        return 0, []
+    return ranked[0].total, [r.notice_id for r in ranked]
+
+
+async def load_items(db: AsyncSession, ids):
+    """NoticeItem de los ids dados, en ese mismo orden."""
+    if not ids:
+        return []
+    rows = await db.execute(select(*VIEW_COLUMNS).where(Notice.id.in_(ids)))
+    by_id = {r.id: row_to_item(r) for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+# =========================
+# RESULTADOS MATERIALIZADOS (paginación)
+# =========================
+# token -> SearchResult; los botones de página llevan solo el token
+RESULT_TTL = 1800
+RESULTS_MAX = 256
+
+_RESULTS = TokenStore(RESULT_TTL, RESULTS_MAX)
+
+
+class SearchResult:
+    __slots__ = ("query", "total", "ids")
+
+    def __init__(self, query, total, ids):
+        self.query = query
+        self.total = total
+        self.ids = ids
+
+
+def store_result(query, total, ids):
+    return _RESULTS.put(SearchResult(query, total, ids))
+
+
+def get_result(token):
+    return _RESULTS.get(token)
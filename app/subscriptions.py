@@ -0,0 +1,196 @@
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .classifier import normalize_text, normalized_object
+from .models import Subscription
+
+CONTRACT_TYPES = ("OBR", "SERV", "ING")
+
+MAX_PER_CHAT = 20
+
+
+def _tokens(text):
+    return normalize_text(text).split()
+
+
+# =========================
+# PARSEO DE /suscribir
+# =========================
+def parse_subscription(args):
+    """
+    /suscribir [OBR|SERV|ING] [min=IMPORTE] [org=ORGANISMO] [palabras clave]
+
+    Devuelve un dict con los criterios (textos ya normalizados) o lanza
+    ValueError con el motivo.
+    """
+    crit = {"contract_type": None, "keyword": None, "min_budget": None, "authority": None}
+    words = []
+
+    for arg in (args or "").split():
+        low = arg.lower()
+        if arg.upper() in CONTRACT_TYPES and crit["contract_type"] is None:
+            crit["contract_type"] = arg.upper()
+        elif low.startswith("min="):
+            raw = arg[4:].replace(".", "").replace(",", ".")
+            try:
+                crit["min_budget"] = Decimal(raw)
+            except InvalidOperation:
+                raise ValueError(f"Importe no válido: {arg[4:]}")
+        elif low.startswith("org="):
+            crit["authority"] = " ".join(_tokens(arg[4:].replace("_", " "))) or None
+        else:
+            words.append(arg)
+
+    crit["keyword"] = " ".join(_tokens(" ".join(words))) or None
+
+    if not any(crit.values()):
+        raise ValueError("Indica al menos un criterio")
+    return crit
+
+
+def describe(sub):
+    parts = []
+    if sub.contract_type:
+        parts.append(sub.contract_type)
+    if sub.keyword:
+        parts.append(f"«{sub.keyword.lower()}»")
+    if sub.min_budget is not None:
+        parts.append(f"≥ {float(sub.min_budget):,.0f} €".replace(",", "."))
+    if sub.authority:
+        parts.append(f"org: {sub.authority.lower()}")
+    return " · ".join(parts)
+
+
+# =========================
+# PERSISTENCIA
+# =========================
+async def list_subscriptions(db: AsyncSession, chat_id):
+    rows = await db.execute(
+        select(Subscription)
+        .where(Subscription.chat_id == chat_id)
+        .order_by(Subscription.id)
+    )
+    return rows.scalars().all()
+
+
+async def add_subscription(db: AsyncSession, chat_id, crit):
+    if len(await list_subscriptions(db, chat_id)) >= MAX_PER_CHAT:
+        raise ValueError(f"Máximo {MAX_PER_CHAT} suscripciones por chat")
+
+    sub = Subscription(chat_id=chat_id, **crit)
+    db.add(sub)
+    await db.commit()
+    return sub
+
+
+async def remove_subscription(db: AsyncSession, chat_id, sub_id=None):
+    """Borra una suscripción del chat (o todas si sub_id es None)."""
+    q = delete(Subscription).where(Subscription.chat_id == chat_id)
+    if sub_id is not None:
+        q = q.where(Subscription.id == sub_id)
+    removed = (await db.execute(q)).rowcount
+    await db.commit()
+    return removed
+
+
+async def load_index(db: AsyncSession):
+    rows = await db.execute(select(Subscription))
+    return SubscriptionIndex(rows.scalars().all())
+
+
+# =========================
+# MATCHER
+# =========================
+class SubscriptionIndex:
+    """
+    Índice invertido de suscripciones para casar cada anuncio sólo
+    contra las candidatas, no contra todas.
+
+    - con palabra clave: se indexan por su primer token; un token del
+      anuncio las alcanza si empieza por él (mismas reglas de prefijo
+      que el filtro de ingenierías: «proyect» casa con «PROYECTO»)
+    - sin palabra clave: se indexan por tipo de contrato (None = todos)
+
+    Las candidatas se verifican después con el resto de criterios.
+    """
+
+    def __init__(self, subs):
+        self.by_token = {}
+        self.by_type = {}
+        self.size = len(subs)
+
+        for sub in subs:
+            if sub.keyword:
+                first = sub.keyword.split()[0]
+                self.by_token.setdefault(first, []).append(sub)
+            else:
+                self.by_type.setdefault(sub.contract_type, []).append(sub)
+
+        # longitudes de clave presentes: acotan los prefijos a probar
+        self._lengths = sorted({len(t) for t in self.by_token})
+
+    def __len__(self):
+        return self.size
+
+    def _candidates(self, tokens, contrato):
+        seen = set()
+        for sub in self.by_type.get(None, ()):
+            seen.add(sub.id)
+            yield sub
+        for sub in self.by_type.get(contrato, ()):
+            seen.add(sub.id)
+            yield sub
+        if contrato == "SERV":
+            for sub in self.by_type.get("ING", ()):
+                seen.add(sub.id)
+                yield sub
+
+        for tok in set(tokens):
+            for n in self._lengths:
+                if n > len(tok):
+                    break
+                for sub in self.by_token.get(tok[:n], ()):
+                    if sub.id not in seen:
+                        seen.add(sub.id)
+                        yield sub
+
+    def match(self, it, contrato):
+        """Suscripciones que casan con el anuncio `it` de la vista `contrato`."""
+        if not self.size:
+            return []
+
+        text = " ".join(normalized_object(it).split())
+        padded = f" {text}"
+        amount = it.budget
+        authority = None
+
+        found = []
+        for sub in self._candidates(text.split(), contrato):
+            if sub.contract_type and sub.contract_type != contrato:
+                ing = sub.contract_type == "ING" and contrato == "SERV"
+                if not (ing and it.is_ingenieria):
+                    continue
+            if sub.keyword and f" {sub.keyword}" not in padded:
+                continue
+            if sub.min_budget is not None and (amount is None or amount < sub.min_budget):
+                continue
+            if sub.authority:
+                if authority is None:
+                    authority = normalize_text(it.entity)
+                if sub.authority not in " ".join(authority.split()):
+                    continue
+            found.append(sub)
+        return found
+
+    def fan_out(self, contrato, items):
+        """
+        [(key, item)] -> {chat_id: [key]}, sin repetir un anuncio en el
+        mismo chat aunque case con varias de sus suscripciones.
+        """
+        by_chat = {}
+        for key, it in items:
+            for chat_id in {sub.chat_id for sub in self.match(it, contrato)}:
+                by_chat.setdefault(chat_id, []).append(key)
+        return by_chat
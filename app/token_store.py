@@ -0,0 +1,54 @@
+import secrets
+import time
+from collections import OrderedDict
+
+
+# =========================
+# TOKENS CORTOS CON TTL + LRU
+# =========================
+# Estado materializado en servidor (vistas, resultados de /buscar) al que
+# los botones apuntan con un token corto dentro del callback_data.
+class TokenStore:
+    """
+    token -> valor, con caducidad deslizante (cada get() renueva el TTL)
+    y como mucho `max_size` entradas: al emitir un token nuevo salen
+    primero las caducadas y después las de uso más antiguo.
+    """
+
+    def __init__(self, ttl, max_size, token_bytes=6):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.token_bytes = token_bytes  # 6 bytes = 8 caracteres base64url
+        self._entries = OrderedDict()   # token -> (valor, caduca), por uso
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _purge(self, now):
+        while self._entries:
+            token, (_, expires) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) < self.max_size:
+                break
+            del self._entries[token]
+
+    def put(self, value):
+        now = time.monotonic()
+        self._purge(now)
+
+        token = secrets.token_urlsafe(self.token_bytes)
+        while token in self._entries:
+            token = secrets.token_urlsafe(self.token_bytes)
+
+        self._entries[token] = (value, now + self.ttl)
+        return token
+
+    def get(self, token):
+        """Valor vivo del token (y renueva su TTL) o None si caducó."""
+        now = time.monotonic()
+        hit = self._entries.get(token)
+        if hit is None or hit[1] <= now:
+            return None
+
+        self._entries[token] = (hit[0], now + self.ttl)
+        self._entries.move_to_end(token)
+        return hit[0]
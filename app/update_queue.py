@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def update_chat_id(update):
+    """Chat al que pertenece un update (para mantener el orden por chat)."""
+    for ev in (
+        update.message,
+        update.edited_message,
+        update.channel_post,
+        update.edited_channel_post,
+    ):
+        if ev is not None:
+            return ev.chat.id
+
+    cb = update.callback_query
+    if cb is not None:
+        if cb.message is not None:
+            return cb.message.chat.id
+        return cb.from_user.id
+
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Cola interna de updates de Telegram: el webhook responde al momento
+    y un pool de workers procesa los updates.
+
+    - orden por chat: cada chat va siempre al mismo worker
+    - profundidad acotada: si la cola está llena, submit() devuelve False
+      y el webhook contesta 503 para que Telegram reintente más tarde
+    - deduplicación por update_id (reintentos de Telegram)
+    """
+
+    def __init__(self, dp, bot, workers=4, max_size=1000, dedup_size=10_000):
+        self.dp = dp
+        self.bot = bot
+        self.n_workers = workers
+        self.max_size = max_size
+        self.dedup_size = dedup_size
+
+        self._queues = []
+        self._tasks = []
+        self._seen = OrderedDict()
+
+    def start(self):
+        if self._tasks:
+            return
+        per_worker = max(1, self.max_size // self.n_workers)
+        self._queues = [asyncio.Queue(per_worker) for _ in range(self.n_workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(q), name=f"update-worker-{i}")
+            for i, q in enumerate(self._queues)
+        ]
+
+    async def stop(self, timeout=10):
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.join() for q in self._queues)),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            log.warning("⚠️ Cola de updates no vaciada al parar")
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    def qsize(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, update):
+        """
+        True si el update queda aceptado (o ya se había recibido),
+        False si no hay sitio.
+        """
+        if update.update_id in self._seen:
+            return True
+
+        shard = hash(update_chat_id(update)) % self.n_workers
+        try:
+            self._queues[shard].put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+
+        self._seen[update.update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _worker(self, queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("⚠️ Error procesando update %s", update.update_id)
+            finally:
+                queue.task_done()
@@ -1,41 +1,442 @@
-from datetime import datetime
-from sqlalchemy.orm import Session
-from .models import Notice, Contract, Meta
-from .euskadi_client import fetch_json, notices_url, contracts_url
+import logging
+from collections import Counter
+from datetime import date, datetime, timezone
+from functools import partial
+from sqlalchemy import select, insert, update, delete, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Notice, Contract, Meta, NoticeTerm
+from .queries import SCOPE_META_KEY, bump_data_version
+from .config import settings
+from .classifier import RULES_VERSION, classify_batch
+from .euskadi_client import client, notices_url, contracts_url
+from .search import index_notices, reindex_all
 
-def set_meta(db: Session, key, value):
-    row = db.get(Meta, key)
+log = logging.getLogger(__name__)
+
+
+async def set_meta(db: AsyncSession, key, value):
+    row = await db.get(Meta, key)
     if not row:
         row = Meta(key=key, value=value)
         db.add(row)
     else:
         row.value = value
 
-def get_meta(db: Session, key, default="—"):
-    row = db.get(Meta, key)
+async def get_meta(db: AsyncSession, key, default="—"):
+    row = await db.get(Meta, key)
     return row.value if row else default
 
-async def refresh_all(db: Session):
+
+# =========================
+# BULK UPSERT
+# =========================
+def _dialect_insert(db: AsyncSession):
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    return None
+
+
+async def upsert_rows(db: AsyncSession, model, rows):
+    """
+    Escribe una página entera en una sola sentencia.
+    PostgreSQL / SQLite: INSERT ... ON CONFLICT DO UPDATE.
+    Otros: un SELECT de ids existentes + INSERT y UPDATE masivos.
+    """
+    if not rows:
+        return 0
+
+    # PK simple o compuesta (p.ej. alert_deliveries: chat + anuncio)
+    pks = [c.name for c in model.__mapper__.primary_key]
+
+    # la API puede repetir un id entre páginas: gana el último
+    rows = list({tuple(r[k] for k in pks): r for r in rows}.values())
+
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(model.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=pks,
+            set_={
+                col: stmt.excluded[col]
+                for col in rows[0]
+                if col not in pks
+            },
+        )
+        # Core executemany: una sola llamada por página, sin pasar por el ORM
+        conn = await db.connection()
+        await conn.execute(stmt, rows)
+        return len(rows)
+
+    pk_cols = [getattr(model, k) for k in pks]
+    found = await db.execute(
+        select(*pk_cols).where(
+            tuple_(*pk_cols).in_([tuple(r[k] for k in pks) for r in rows])
+        )
+    )
+    existing = {tuple(r) for r in found}
+    new_rows = [r for r in rows if tuple(r[k] for k in pks) not in existing]
+    old_rows = [r for r in rows if tuple(r[k] for k in pks) in existing]
+
+    if new_rows:
+        await db.execute(insert(model), new_rows)
+    if old_rows:
+        await db.execute(update(model), old_rows)
+
+    return len(rows)
+
+
+# =========================
+# FECHAS (se parsean una vez, al escribir)
+# =========================
+def parse_datetime(s):
+    """ISO 8601 de la API -> datetime naive en UTC."""
+    if not s:
+        return None
+    try:
+        d = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if d.tzinfo is not None:
+        d = d.astimezone(timezone.utc).replace(tzinfo=None)
+    return d
+
+
+def parse_date(s):
+    if not s:
+        return None
+    try:
+        return date.fromisoformat(s[:10])
+    except ValueError:
+        return None
+
+
+# =========================
+# TERRITORIO (NUTS)
+# =========================
+def notice_scope(item):
+    """
+    NUTS del poder adjudicador: contractingAuthority.scope, la columna
+    contracting_authority_scope (texto o {"id": ...}). Es lo mismo que
+    filtra el parámetro p26 de los RSS; None si la API no lo trae.
+    """
+    scope = (item.get("contractingAuthority") or {}).get("scope")
+    if isinstance(scope, dict):
+        scope = scope.get("id") or scope.get("code")
+    if not isinstance(scope, str) or not scope.strip():
+        return None
+    return scope.strip().upper()
+
+
+def notice_row(item, now):
+    return {
+        "id": item["id"],
+        "code": item.get("code"),
+        "object": item.get("object"),
+        "last_publication_date": parse_datetime(item.get("lastPublicationDate")),
+        "first_publication_date": parse_datetime(item.get("firstPublicationDate")),
+        "contract_type_id": (item.get("contractType") or {}).get("id"),
+        "procedure_status_id": (item.get("contractProcedureStatus") or {}).get("id"),
+        "deadline_date": parse_date(item.get("deadlineDate")),
+        "budget_without_vat": item.get("budgetWithoutVAT"),
+        "main_entity_of_page": item.get("mainEntityOfPage"),
+        "contracting_authority_name": (item.get("contractingAuthority") or {}).get("name"),
+        "contracting_authority_scope": notice_scope(item),
+        "updated_at": now,
+    }
+
+
+def notice_rows(items, now, stats=None):
+    """
+    Filas de una página de anuncios, solo del territorio de los feeds
+    RSS. `stats` (Counter) acumula guardados / de otro territorio / sin
+    territorio para que refresh_all() sepa si la sincronización sirve.
+    """
+    rows, other, unknown = [], 0, 0
+    for item in items:
+        row = notice_row(item, now)
+        scope = row["contracting_authority_scope"]
+        if scope == settings.NUTS:
+            rows.append(row)
+        elif scope is None:
+            unknown += 1
+        else:
+            other += 1
+
+    if items and unknown == len(items):
+        log.warning(
+            "⚠️ Página de %s anuncios sin territorio (contractingAuthority.scope): no se guarda ninguno",
+            len(items),
+        )
+    if stats is not None:
+        stats.update(kept=len(rows), other=other, unknown=unknown)
+
+    # la clasificación ING se guarda al ingerir (una pasada por página)
+    for row, c in zip(rows, classify_batch(rows)):
+        row["is_ingenieria"] = c.is_ing
+
+    return rows
+
+
+def contract_row(item, now):
+    cpv = item.get("cpv")
+    if isinstance(cpv, dict):
+        cpv = cpv.get("id")
+
+    # contracting_notice_id lo rellena link_contracts()
+    return {
+        "id": str(item["id"]),
+        "contracting_notice_ref": (item.get("contractingNotice") or {}).get("id"),
+        "object": item.get("object"),
+        "contract_type_id": (item.get("contractType") or {}).get("id"),
+        "procedure_status_id": (item.get("contractProcedureStatus") or {}).get("id"),
+        "procedure_type_id": (item.get("procedureType") or {}).get("id"),
+        "award_date": parse_date(item.get("awardDate")),
+        "contract_end_date": parse_date(item.get("contractEndDate")),
+        "award_amount": item.get("awardAmount"),
+        "award_amount_without_vat": item.get("awardAmountWithoutVAT"),
+        "months_contract_duration": item.get("monthsContractDuration"),
+        "cpv": cpv,
+        "minor_contract": item.get("minorContract"),
+        "main_entity_of_page": item.get("mainEntityOfPage"),
+    }
+
+
+def contract_rows(items, now):
+    return [contract_row(item, now) for item in items]
+
+
+async def needs_full_sync(db: AsyncSession, now):
+    # BD de otro territorio (o anterior al filtro): reconciliación completa
+    if await get_meta(db, SCOPE_META_KEY, None) != settings.NUTS:
+        return True
+
+    last = await get_meta(db, "last_full_sync", None)
+    if not last:
+        return True
+    age = now - datetime.fromisoformat(last)
+    return age.total_seconds() >= settings.FULL_SYNC_HOURS * 3600
+
+
+async def iter_new_pages(page_url, date_key, watermark):
+    """
+    Páginas ordenadas por fecha DESC: en cuanto una página llega a
+    fechas ya vistas (<= watermark) no hace falta seguir.
+    """
+    page = 1
+    while True:
+        data = await client.fetch_json(page_url(page))
+        yield data
+
+        dates = [
+            it.get(date_key)
+            for it in data.get("items", [])
+            if it.get(date_key)
+        ]
+        if not dates or min(dates) <= watermark:
+            break
+        if page >= data.get("totalPages", 0):
+            break
+        page += 1
+
+
+async def sync_pages(db: AsyncSession, model, page_url, to_rows, date_key, wm_key, full, now, on_rows=None):
+    watermark = await get_meta(db, wm_key, None)
+
+    if full or not watermark:
+        pages = client.iter_pages(page_url)
+    else:
+        pages = iter_new_pages(page_url, date_key, watermark)
+
+    newest = watermark
+    async for data in pages:
+        items = data.get("items", [])
+        rows = to_rows(items, now)
+        await upsert_rows(db, model, rows)
+        if on_rows is not None:
+            await on_rows(db, rows)
+
+        for it in items:
+            d = it.get(date_key)
+            if d and (newest is None or d > newest):
+                newest = d
+
+        await db.commit()
+
+    if newest:
+        await set_meta(db, wm_key, newest)
+
+
+async def link_contracts(db: AsyncSession):
+    """
+    Enlaza en una sola sentencia los contratos cuyo anuncio ya está en
+    notices (el anuncio puede llegar después que la adjudicación).
+    """
+    await db.execute(
+        update(Contract)
+        .where(Contract.contracting_notice_id.is_(None))
+        .where(Contract.contracting_notice_ref.in_(select(Notice.id)))
+        .values(contracting_notice_id=Contract.contracting_notice_ref)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def purge_out_of_scope(db: AsyncSession):
+    """
+    Borra los anuncios de otros territorios (o sin territorio, de antes
+    del filtro) junto con sus términos de búsqueda.
+    """
+    out = or_(
+        Notice.contracting_authority_scope.is_(None),
+        Notice.contracting_authority_scope != settings.NUTS,
+    )
+    out_ids = select(Notice.id).where(out)
+
+    await db.execute(
+        update(Contract)
+        .where(Contract.contracting_notice_id.in_(out_ids))
+        .values(contracting_notice_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(NoticeTerm)
+        .where(NoticeTerm.notice_id.in_(out_ids))
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(Notice).where(out).execution_options(synchronize_session=False)
+    )
+
+
+async def refresh_all(db: AsyncSession, full=None):
+    """
+    full=None: incremental salvo que toque la reconciliación periódica.
+    """
+    now = datetime.utcnow()
+    if full is None:
+        full = await needs_full_sync(db, now)
+
+    scope_stats = Counter()
     for contract_type in (1, 2):
-        page = 1
-        while True:
-            data = await fetch_json(notices_url(contract_type, page))
-            for item in data.get("items", []):
-                n = db.get(Notice, item["id"]) or Notice(id=item["id"])
-                n.object = item.get("object")
-                n.last_publication_date = item.get("lastPublicationDate")
-                n.first_publication_date = item.get("firstPublicationDate")
-                n.contract_type_id = item.get("contractType", {}).get("id")
-                n.procedure_status_id = item.get("contractProcedureStatus", {}).get("id")
-                n.budget_without_vat = item.get("budgetWithoutVAT")
-                n.main_entity_of_page = item.get("mainEntityOfPage")
-                n.contracting_authority_name = item.get("contractingAuthority", {}).get("name")
-                db.add(n)
-
-            db.commit()
-            if page >= data.get("totalPages", 0):
-                break
-            page += 1
-
-    set_meta(db, "last_update_human", datetime.now().strftime("%Y-%m-%d %H:%M"))
-    db.commit()
+        await sync_pages(
+            db, Notice,
+            lambda page: notices_url(contract_type, page),
+            partial(notice_rows, stats=scope_stats),
+            "lastPublicationDate",
+            f"notices_watermark_{contract_type}",
+            full, now,
+            on_rows=index_notices,  # índice de /buscar, página a página
+        )
+
+    for contract_type in (1, 2):
+        await sync_pages(
+            db, Contract,
+            lambda page: contracts_url(contract_type, page),
+            contract_rows,
+            "awardDate",
+            f"contracts_watermark_{contract_type}",
+            full, now,
+        )
+
+    log.info(
+        "📍 Anuncios %s: %s guardados, %s de otro territorio, %s sin territorio",
+        settings.NUTS, scope_stats["kept"], scope_stats["other"], scope_stats["unknown"],
+    )
+    # sin un solo anuncio del territorio la sincronización no cubre nada:
+    # no se purga ni se marca la BD como lista (las vistas siguen en RSS)
+    scoped = scope_stats["kept"] > 0
+    if full and not scoped:
+        log.warning("⚠️ Sincronización completa sin anuncios de %s", settings.NUTS)
+
+    if full and scoped:
+        await purge_out_of_scope(db)
+
+    await link_contracts(db)
+
+    if full:
+        await set_meta(db, "last_full_sync", now.isoformat())
+    if full and scoped:
+        # a partir de aquí las vistas pueden servirse desde la BD
+        await set_meta(db, SCOPE_META_KEY, settings.NUTS)
+    await set_meta(db, "last_update_human", datetime.now().strftime("%Y-%m-%d %H:%M"))
+    await db.commit()
+    bump_data_version()
+
+
+# =========================
+# RECLASIFICACIÓN ING
+# =========================
+RECLASSIFY_CHUNK = 1000
+
+
+async def reclassify_all(db: AsyncSession):
+    """
+    Recalcula Notice.is_ingenieria para toda la tabla (p.ej. tras cambiar
+    ING_POSITIVE / ING_NEGATIVE). Solo escribe las filas que cambian.
+    """
+    changed = 0
+    last_id = None
+
+    while True:
+        q = select(Notice.id, Notice.object, Notice.is_ingenieria).order_by(Notice.id)
+        if last_id is not None:
+            q = q.where(Notice.id > last_id)
+        rows = (await db.execute(q.limit(RECLASSIFY_CHUNK))).all()
+        if not rows:
+            break
+
+        items = [{"id": r.id, "object": r.object} for r in rows]
+        updates = [
+            {"id": r.id, "is_ingenieria": c.is_ing}
+            for r, c in zip(rows, classify_batch(items))
+            if r.is_ingenieria is not c.is_ing
+        ]
+        if updates:
+            await db.execute(update(Notice), updates)
+            changed += len(updates)
+
+        last_id = rows[-1].id
+
+    await set_meta(db, "ing_rules_version", RULES_VERSION)
+    await db.commit()
+    if changed:
+        bump_data_version()
+    return changed
+
+
+async def ensure_classification(db: AsyncSession):
+    """Reclasifica solo si las listas de palabras clave han cambiado."""
+    if await get_meta(db, "ing_rules_version", None) == RULES_VERSION:
+        return 0
+    return await reclassify_all(db)
+
+
+async def _reclassify_cli():
+    from .database import SessionLocal
+
+    async with SessionLocal() as db:
+        print(f"[ING] {await reclassify_all(db)} anuncios reclasificados")
+
+
+async def _reindex_cli():
+    from .database import SessionLocal
+
+    async with SessionLocal() as db:
+        print(f"[BUSCAR] {await reindex_all(db)} anuncios indexados")
+
+
+if __name__ == "__main__":
+    # python -m app.updater reclassify | reindex
+    import asyncio
+    import sys
+
+    if sys.argv[1:] == ["reclassify"]:
+        asyncio.run(_reclassify_cli())
+    elif sys.argv[1:] == ["reindex"]:
+        asyncio.run(_reindex_cli())
+    else:
+        print("uso: python -m app.updater reclassify | reindex")
@@ -0,0 +1,62 @@
+from .token_store import TokenStore
+
+# =========================
+# ESTADO DE VISTA EN CALLBACK_DATA
+# =========================
+# Cada vista abierta (contrato, estado) recibe un token corto que apunta
+# al lote ya materializado en servidor. Los botones de navegación llevan
+# el token, así que paginar no recalcula nada y el usuario sigue viendo
+# el mismo resultado aunque entren datos nuevos mientras navega.
+VIEW_STATE_TTL = 1800  # 30 min desde el último uso
+VIEW_STATE_MAX = 512
+
+# callback_data de Telegram: máximo 64 bytes
+CALLBACK_PREFIX = "vs"
+CALLBACK_MAX_LEN = 64
+
+
+class ViewState:
+    __slots__ = ("contrato", "estado", "batch")
+
+    def __init__(self, contrato, estado, batch):
+        self.contrato = contrato
+        self.estado = estado
+        self.batch = batch
+
+
+# token -> ViewState, en orden de último uso (TTL deslizante)
+_STATES = TokenStore(VIEW_STATE_TTL, VIEW_STATE_MAX)
+
+# (contrato, estado) -> token del lote vigente, para no emitir un token
+# nuevo por cada usuario que abre la misma vista
+_current = {}
+
+
+def issue(contrato, estado, batch):
+    token = _current.get((contrato, estado))
+    state = _STATES.get(token) if token else None
+    if state is not None and state.batch is batch:
+        return token
+
+    token = _STATES.put(ViewState(contrato, estado, batch))
+    _current[(contrato, estado)] = token
+    return token
+
+
+def get(token):
+    """ViewState vivo del token (y renueva su TTL) o None si caducó."""
+    return _STATES.get(token)
+
+
+def pack(token, vista, page, contrato, estado):
+    # contrato y estado viajan también: con el token caducado se
+    # reconstruye la vista desde los datos actuales
+    data = f"{CALLBACK_PREFIX}:{token}:{vista}:{page}:{contrato}:{estado}"
+    if len(data.encode()) > CALLBACK_MAX_LEN:
+        raise ValueError(f"callback_data de más de {CALLBACK_MAX_LEN} bytes: {data}")
+    return data
+
+
+def unpack(data):
+    _, token, vista, page, contrato, estado = data.split(":")
+    return token, vista, int(page), contrato, estado
@@ -0,0 +1,44 @@
+"""
+Benchmark de extract_notice_fields sobre las fichas guardadas en
+fixtures/enrichment:
+
+    python tests/bench_enrichment.py [repeticiones]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.enrichment import extract_notice_fields  # noqa: E402
+
+FIXTURES = Path(__file__).parent / "fixtures" / "enrichment"
+
+# relleno típico de una ficha real (menú, avisos legales...) para medir
+# también el coste de recorrer HTML que no aporta campos
+PADDING = "<div class='menu'>" + "<p>Enlace de navegación</p>" * 400 + "</div>"
+
+
+def bench(pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            extract_notice_fields(html)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(pages)) * 1e6
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = [p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("*.html"))]
+    padded = [p.replace("<body>", "<body>" + PADDING, 1) for p in pages]
+
+    print(f"{len(pages)} fichas × {repeat} repeticiones")
+    print(f"  fichas tal cual:     {bench(pages, repeat):8.1f} µs/ficha")
+    print(f"  con 400 nodos extra: {bench(padded, repeat):8.1f} µs/ficha")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark de escritura de anuncios en SQLite: el bucle antiguo de
+refresh_all (db.get + ORM fila a fila) frente a upsert_rows (una
+sentencia INSERT ... ON CONFLICT por página):
+
+    python tests/bench_upsert.py [anuncios]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import Notice  # noqa: E402
+from app.updater import notice_row, upsert_rows  # noqa: E402
+
+PAGE_SIZE = 50  # itemsOfPage de la API
+
+
+def api_item(i, rev):
+    return {
+        "id": i,
+        "code": f"KM/2025/{i:06d}",
+        "object": f"Redacción del proyecto {i} (rev {rev})",
+        "lastPublicationDate": "2025-10-01T10:00:00+02:00",
+        "firstPublicationDate": "2025-09-15T09:00:00Z",
+        "contractType": {"id": 1 + i % 2},
+        "contractProcedureStatus": {"id": 3},
+        "deadlineDate": "2025-11-14",
+        "budgetWithoutVAT": 1000.0 + i,
+        "mainEntityOfPage": f"https://www.contratacion.euskadi.eus/anuncio/{i}",
+        "contractingAuthority": {"name": "Ayuntamiento de Irun", "scope": settings.NUTS},
+    }
+
+
+def pages(n, rev):
+    for start in range(0, n, PAGE_SIZE):
+        yield [api_item(i, rev) for i in range(start, min(start + PAGE_SIZE, n))]
+
+
+async def old_loop(db, n, rev):
+    # como el refresh_all original: un SELECT por anuncio y escritura ORM
+    now = datetime.utcnow()
+    for page in pages(n, rev):
+        for item in page:
+            row = notice_row(item, now)
+            obj = await db.get(Notice, row["id"]) or Notice(id=row["id"])
+            for col, value in row.items():
+                setattr(obj, col, value)
+            db.add(obj)
+        await db.commit()
+
+
+async def bulk(db, n, rev):
+    now = datetime.utcnow()
+    for page in pages(n, rev):
+        await upsert_rows(db, Notice, [notice_row(item, now) for item in page])
+        await db.commit()
+
+
+async def measure(write, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+        out = []
+        # 1ª pasada: todo inserciones; 2ª: todo actualizaciones
+        for rev in (1, 2):
+            async with session() as db:
+                start = time.perf_counter()
+                await write(db, n, rev)
+                out.append(n / (time.perf_counter() - start))
+
+        async with session() as db:
+            assert await db.scalar(select(func.count()).select_from(Notice)) == n
+        await engine.dispose()
+        return out
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    print(f"{n} anuncios en páginas de {PAGE_SIZE} (SQLite)")
+    for name, write in (("bucle db.get + ORM", old_loop), ("upsert_rows", bulk)):
+        ins, upd = await measure(write, n)
+        print(f"  {name:20} inserción {ins:9,.0f} filas/s · actualización {upd:9,.0f} filas/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# app.database exige DATABASE_URL al importarse; los tests no tocan la BD
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
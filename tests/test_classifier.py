@@ -0,0 +1,151 @@
+import random
+import re
+import unicodedata
+
+import pytest
+
+from app.classifier import (
+    ING_NEGATIVE,
+    ING_POSITIVE,
+    _classify_texts,
+    classify_batch,
+    normalize_text,
+)
+
+
+# =========================
+# REFERENCIA: implementación original (bot_handlers.py)
+# =========================
+def old_normalize_text(s):
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFD", s)
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = s.upper()
+    s = re.sub(r"[^A-Z0-9 ]+", " ", s)
+    return s
+
+
+def old_is_ingenieria(obj):
+    txt = old_normalize_text(obj)
+    if not any(k in txt for k in ING_POSITIVE):
+        return False
+    if any(k in txt for k in ING_NEGATIVE):
+        return False
+    return True
+
+
+# títulos sintéticos: palabras clave enteras, troceadas y dentro de
+# palabras más largas, con acentos, ligaduras y signos
+FRAGMENTS = (
+    ING_POSITIVE + ING_NEGATIVE + [
+        "Ingeniería", "ingenieros", "INGE", "proyecto", "Proyección",
+        "redacción", "dirección de obra", "DIRECCIÓN", "obra", "asistencia",
+        "técnica", "limpieza", "seguridad", "privada", "gestión", "cultural",
+        "agua", "aguas", "paraguas", "camino", "caminos", "estructuras",
+        "Ñandú", "pingüino", "Zarautz", "Oñati", "ﬁnanciación", "ﬂota",
+        "Æsir", "Straße", "œuvre", "№", "½", "Ⅻ", "électrico",
+        "de", "la", "y", "del", "-", "/", "(", ")", ",", "·", "\t", "  ",
+        "2025", "Lote 3", "",
+    ]
+)
+
+
+def random_titles(n, seed=7):
+    rnd = random.Random(seed)
+    titles = []
+    for _ in range(n):
+        words = rnd.choices(FRAGMENTS, k=rnd.randint(0, 9))
+        sep = rnd.choice([" ", "", "-", " / "])
+        title = sep.join(words)
+        titles.append(title.lower() if rnd.random() < 0.3 else title)
+    return titles
+
+
+# =========================
+# NORMALIZACIÓN
+# =========================
+def test_normalize_matches_original_on_every_bmp_char():
+    chars = [chr(cp) for cp in range(0x10000) if not 0xD800 <= cp <= 0xDFFF]
+    assert [normalize_text(c) for c in chars] == [old_normalize_text(c) for c in chars]
+
+
+@pytest.mark.parametrize("text", [
+    "Ingeniería de caminos",
+    "DIRECCIÓN de obra · Oñati",
+    "ﬁnanciación ﬂota",          # ligaduras: no se descomponen con NFD
+    "Straße Æsir œuvre",
+    "électrico",             # acento combinante suelto
+    "Ⅻ ½ № 2025",
+    "",
+    None,
+])
+def test_normalize_examples(text):
+    assert normalize_text(text) == old_normalize_text(text)
+
+
+def test_normalize_matches_original_on_titles():
+    for title in random_titles(2_000, seed=1):
+        assert normalize_text(title) == old_normalize_text(title)
+
+
+# =========================
+# CLASIFICACIÓN
+# =========================
+def test_classification_matches_original_any_scan():
+    titles = random_titles(20_000)
+    items = [{"id": None, "object": t} for t in titles]
+
+    got = [c.is_ing for c in classify_batch(items)]
+    expected = [old_is_ingenieria(t) for t in titles]
+
+    assert sum(expected) > 1_000  # el corpus ejercita los dos lados
+    assert got == expected
+
+
+def test_matched_keywords_are_real_substrings():
+    for title in random_titles(2_000, seed=3):
+        txt = normalize_text(title)
+        c = _classify_texts([txt])[0]
+        assert all(k in txt for k in c.positive)
+        assert all(k in txt for k in c.negative)
+        assert bool(c.positive) == any(k in txt for k in ING_POSITIVE)
+        assert bool(c.negative) == any(k in txt for k in ING_NEGATIVE)
+
+
+@pytest.mark.parametrize("title, is_ing, positive", [
+    ("Ingeniería de caminos", True, ("CAMINO", "INGENIERIA")),
+    # palabra clave dentro de una palabra más larga (como el any() original)
+    ("Paraguas municipales", True, ("AGUA",)),
+    ("Redacción del proyecto", True, ("PROYECT", "REDACCION")),
+    ("Limpieza de la red de saneamiento", False, ("SANEAMIENTO",)),
+    ("Suministro de mobiliario", False, ()),
+])
+def test_examples(title, is_ing, positive):
+    c = classify_batch([{"id": None, "object": title}])[0]
+    assert c.is_ing is is_ing
+    assert c.positive == positive
+
+
+def test_keywords_do_not_span_batch_boundaries():
+    # "DIRECCION" + "OBRA" o "PROYEC" + "TO" solo casan dentro de un texto
+    texts = ["SERVICIO DE DIRECCION", "OBRA NUEVA", "PROYEC", "TO", "ING", ""]
+    batch = _classify_texts(texts)
+    single = [_classify_texts([t])[0] for t in texts]
+    assert batch == single
+    assert "DIRECCION OBRA" not in batch[0].positive
+    assert batch[2].positive == () and batch[3].positive == ()
+    assert batch[4].positive == ("ING",)
+
+
+def test_batch_equals_one_by_one():
+    titles = random_titles(3_000, seed=5)
+    texts = [normalize_text(t) for t in titles]
+    assert _classify_texts(texts) == [_classify_texts([t])[0] for t in texts]
+
+
+def test_cache_tracks_text_changes():
+    item = {"id": "cache-test", "object": "Limpieza de oficinas"}
+    assert classify_batch([item])[0].is_ing is False
+    item["object"] = "Redacción del proyecto"
+    assert classify_batch([item])[0].is_ing is True
@@ -0,0 +1,82 @@
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from app.enrichment import extract_notice_fields, to_item_fields
+
+FIXTURES = Path(__file__).parent / "fixtures" / "enrichment"
+
+# valores esperados de cada ficha; un campo ausente no debe aparecer
+EXPECTED = {
+    "ficha_dl.html": {
+        "deadline_date": date(2025, 11, 14),
+        "budget_without_vat": 245000.0,
+        "entity_name": "Ayuntamiento de Irun",
+    },
+    "ficha_tabla.html": {
+        "deadline_date": date(2025, 12, 3),
+        "budget_without_vat": 1234567.89,
+        "entity_name": "Diputación Foral de Gipuzkoa",
+    },
+    "ficha_parrafos.html": {
+        "deadline_date": date(2025, 11, 21),
+        "budget_without_vat": 58300.5,
+    },
+    "ficha_presupuesto_cero.html": {
+        "deadline_date": date(2025, 10, 30),
+        "budget_without_vat": 0.0,
+        "entity_name": "Mancomunidad de Servicios del Txingudi",
+    },
+    "ficha_en_linea.html": {
+        "deadline_date": date(2026, 1, 9),
+        "budget_without_vat": 2480000.0,
+        "entity_name": "Ayuntamiento de Zarautz",
+    },
+}
+
+
+def load(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_fixture_fields(name):
+    assert extract_notice_fields(load(name)) == EXPECTED[name]
+
+
+def test_every_fixture_has_expectations():
+    assert sorted(p.name for p in FIXTURES.glob("*.html")) == sorted(EXPECTED)
+
+
+def test_separator_cell_is_not_the_value():
+    html = "<table><tr><th>Órgano de contratación:</th><td>:</td><td>Ayuntamiento de Eibar</td></tr></table>"
+    assert extract_notice_fields(html)["entity_name"] == "Ayuntamiento de Eibar"
+
+
+def test_next_label_is_not_the_value():
+    html = "<p>Órgano de contratación</p><p>Fecha límite</p><p>01/12/2025</p>"
+    out = extract_notice_fields(html)
+    assert "entity_name" not in out
+    assert out["deadline_date"] == date(2025, 12, 1)
+
+
+def test_zero_budget_is_kept():
+    out = extract_notice_fields("<dt>Presupuesto</dt><dd>0,00</dd>")
+    assert out == {"budget_without_vat": 0.0}
+    assert to_item_fields(out) == {"budget": 0.0}
+
+
+def test_value_window_is_bounded():
+    filler = "".join(f"<p>texto {i}</p>" for i in range(20))
+    html = f"<p>Fecha límite</p>{filler}<p>01/12/2025</p>"
+    assert extract_notice_fields(html) == {}
+
+
+def test_scripts_and_styles_are_ignored():
+    html = (
+        "<script>var x = 'Presupuesto 1.000,00';</script>"
+        "<style>/* Fecha límite 01/01/1999 */</style>"
+        "<p>Presupuesto</p><p>2.000,00</p>"
+    )
+    assert extract_notice_fields(html) == {"budget_without_vat": 2000.0}
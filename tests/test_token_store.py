@@ -0,0 +1,71 @@
+import pytest
+
+from app import token_store, view_state
+from app.token_store import TokenStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def store(monkeypatch, ttl=10, max_size=3):
+    clock = Clock()
+    monkeypatch.setattr(token_store.time, "monotonic", clock)
+    return TokenStore(ttl, max_size), clock
+
+
+def test_put_get_and_sliding_ttl(monkeypatch):
+    s, clock = store(monkeypatch)
+    token = s.put("a")
+    assert len(token) == 8
+    clock.now += 8
+    assert s.get(token) == "a"      # renueva el TTL
+    clock.now += 8
+    assert s.get(token) == "a"
+    clock.now += 11
+    assert s.get(token) is None
+    assert s.get("no-existe") is None
+
+
+def test_lru_bound_evicts_least_recently_used(monkeypatch):
+    s, _ = store(monkeypatch, max_size=3)
+    a, b, c = s.put("a"), s.put("b"), s.put("c")
+    s.get(a)                        # b pasa a ser el más antiguo
+    d = s.put("d")
+    assert len(s) == 3
+    assert s.get(b) is None
+    assert [s.get(t) for t in (a, c, d)] == ["a", "c", "d"]
+
+
+def test_expired_entries_are_purged_first(monkeypatch):
+    s, clock = store(monkeypatch, max_size=3)
+    old = s.put("old")
+    clock.now += 5
+    keep = s.put("keep")
+    clock.now += 6                  # old caduca, keep sigue vivo
+    s.put("new")
+    assert len(s) == 2
+    assert s.get(old) is None and s.get(keep) == "keep"
+
+
+def test_view_state_reuses_token_for_same_batch():
+    batch, other = object(), object()
+    token = view_state.issue("OBR", "ABI", batch)
+    assert view_state.issue("OBR", "ABI", batch) == token
+    assert view_state.get(token).batch is batch
+
+    fresh = view_state.issue("OBR", "ABI", other)
+    assert fresh != token
+    assert view_state.get(token).batch is batch   # el lote viejo sigue vivo
+
+
+def test_pack_roundtrip_and_length_limit():
+    data = view_state.pack("AbCdEfGh", "RES", 12, "SERV", "ABI")
+    assert view_state.unpack(data) == ("AbCdEfGh", "RES", 12, "SERV", "ABI")
+
+    with pytest.raises(ValueError):
+        view_state.pack("x" * 60, "RES", 0, "SERV", "ABI")
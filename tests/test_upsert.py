@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import updater
+from app.database import Base
+from app.models import AlertDelivery, Meta
+from app.updater import upsert_rows
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_session(path, fn):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            return await fn(db)
+    finally:
+        await engine.dispose()
+
+
+def delivery(chat_id, key, fp, attempts=0):
+    return {
+        "chat_id": chat_id,
+        "notice_key": key,
+        "fingerprint": fp,
+        "contract_type": "OBR",
+        "is_new": True,
+        "attempts": attempts,
+        "created_at": datetime(2025, 10, 1),
+        "sent_at": None,
+    }
+
+
+async def all_deliveries(db):
+    rows = await db.execute(
+        select(
+            AlertDelivery.chat_id,
+            AlertDelivery.notice_key,
+            AlertDelivery.fingerprint,
+            AlertDelivery.attempts,
+        ).order_by(AlertDelivery.chat_id, AlertDelivery.notice_key)
+    )
+    return rows.all()
+
+
+@pytest.fixture(params=["on_conflict", "select_then_write"])
+def dialect_path(request, monkeypatch):
+    # select_then_write: el camino de los motores sin ON CONFLICT
+    if request.param == "select_then_write":
+        monkeypatch.setattr(updater, "_dialect_insert", lambda db: None)
+    return request.param
+
+
+def test_composite_pk_insert_and_update(tmp_path, dialect_path):
+    async def scenario(db):
+        await upsert_rows(db, AlertDelivery, [
+            delivery(1, "db:1", "a"),
+            delivery(2, "db:1", "a"),
+        ])
+        await db.commit()
+        # misma noticia, otro chat: fila nueva; mismo par: se actualiza
+        await upsert_rows(db, AlertDelivery, [
+            delivery(1, "db:1", "b", attempts=2),
+            delivery(1, "db:2", "c"),
+        ])
+        await db.commit()
+        return await all_deliveries(db)
+
+    assert run(with_session(tmp_path / "t.db", scenario)) == [
+        (1, "db:1", "b", 2),
+        (1, "db:2", "c", 0),
+        (2, "db:1", "a", 0),
+    ]
+
+
+def test_duplicate_keys_in_one_call_last_wins(tmp_path, dialect_path):
+    async def scenario(db):
+        n = await upsert_rows(db, AlertDelivery, [
+            delivery(1, "db:1", "old"),
+            delivery(1, "db:1", "new"),
+            delivery(2, "db:1", "other"),
+        ])
+        await db.commit()
+        return n, await all_deliveries(db)
+
+    n, rows = run(with_session(tmp_path / "t.db", scenario))
+    assert n == 2
+    assert rows == [(1, "db:1", "new", 0), (2, "db:1", "other", 0)]
+
+
+def test_single_pk_dedupe(tmp_path, dialect_path):
+    async def scenario(db):
+        await upsert_rows(db, Meta, [
+            {"key": "a", "value": "1"},
+            {"key": "a", "value": "2"},
+        ])
+        await db.commit()
+        await upsert_rows(db, Meta, [{"key": "a", "value": "3"}])
+        await db.commit()
+        return (await db.execute(select(Meta.key, Meta.value))).all()
+
+    assert run(with_session(tmp_path / "t.db", scenario)) == [("a", "3")]
+
+
+def test_empty_rows_is_a_noop(tmp_path):
+    async def scenario(db):
+        return await upsert_rows(db, AlertDelivery, [])
+
+    assert run(with_session(tmp_path / "t.db", scenario)) == 0